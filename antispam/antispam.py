@@ -1,18 +1,30 @@
+import asyncio
 import logging
-from datetime import datetime, timedelta
+import time
+from datetime import timedelta
 
 import discord
 from redbot.core import Config, commands
 from redbot.core.commands.converter import TimedeltaConverter
 from redbot.core.utils.chat_formatting import humanize_timedelta, pagify
 
+from .bypass import BypassCache, roles_hash
+from .converters import CommandOrCog
+from .limiter import Blacklist, RateLimiter
+
 log = logging.getLogger("red.flare.antispam")
 
+SWEEP_INTERVAL = 60
+# Blacklist changes are written together this many seconds after the first one.
+SAVE_DELAY = 10
+# Core commands that change who counts as a mod or admin.
+ROLE_COMMANDS = {"set addadminrole", "set removeadminrole", "set addmodrole", "set removemodrole"}
+
 
 class AntiSpam(commands.Cog):
     """Blacklist those who spam commands."""
 
-    __version__ = "0.0.3"
+    __version__ = "0.4.0"
     __author__ = "flare#0001"
 
     def format_help_for_context(self, ctx):
@@ -23,53 +35,149 @@ class AntiSpam(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.config = Config.get_conf(self, identifier=95932766180343808, force_registration=True)
-        self.config.register_global(mute_length=300, amount=5, per=5, mod_bypass=True)
-        self.cache = {}
-        self.blacklist = {}
+        self.config.register_global(
+            mute_length=300, amount=5, per=5, mod_bypass=True, costs={}, blacklist=[]
+        )
+        self.config.register_guild(mute_length=None, amount=None, per=None)
+        self.policies = {}
+        self.default_policy = (5, 5, 300)
+        self.command_costs = {}
+        self.limiter = RateLimiter()
+        self.blacklist = Blacklist()
+        self.bypass_cache = BypassCache()
+        self.sweep_task = self.bot.loop.create_task(self.sweep_loop())
+        self.save_event = asyncio.Event()
+        self.save_task = self.bot.loop.create_task(self.save_loop())
         bot.add_check(self.check)
 
+    def cog_unload(self):
+        self.bot.remove_check(self.check)
+        self.sweep_task.cancel()
+        self.save_task.cancel()
+
     async def gen_cache(self):
         self.config_cache = await self.config.all()
+        self.default_policy = (
+            self.config_cache["amount"],
+            self.config_cache["per"],
+            self.config_cache["mute_length"],
+        )
+        # Guild overrides are merged with the global settings here so on_command only has to
+        # do a single lookup.
+        self.policies = {
+            guild_id: tuple(
+                default if data[key] is None else data[key]
+                for key, default in zip(("amount", "per", "mute_length"), self.default_policy)
+            )
+            for guild_id, data in (await self.config.all_guilds()).items()
+        }
+        self.command_costs = {}
+
+    def command_cost(self, command) -> float:
+        """Cost of command, set for the command itself or its cog, defaulting to 1."""
+        cost = self.command_costs.get(command.qualified_name)
+        if cost is None:
+            costs = self.config_cache["costs"]
+            cost = costs.get(command.qualified_name, costs.get(command.cog_name, 1))
+            self.command_costs[command.qualified_name] = cost
+        return cost
+
+    async def sweep_loop(self):
+        while True:
+            await asyncio.sleep(SWEEP_INTERVAL)
+            self.limiter.sweep()
+            self.bypass_cache.sweep()
+            for guild, user in self.blacklist.sweep():
+                log.debug(f"{user} has been removed from the spam blacklist in {guild}.")
+
+    async def save_loop(self):
+        # Loaded here rather than in setup so startup doesn't wait on it, entries blacklisted
+        # meanwhile are kept and the saved ones that already expired are skipped.
+        added = self.blacklist.load(await self.config.blacklist())
+        log.debug(f"Loaded {added} saved spam blacklist entries.")
+        try:
+            while True:
+                await self.save_event.wait()
+                await asyncio.sleep(SAVE_DELAY)
+                await self.save_blacklist()
+        except asyncio.CancelledError:
+            if self.save_event.is_set():
+                await self.save_blacklist()
+            raise
+
+    async def save_blacklist(self):
+        self.save_event.clear()
+        try:
+            await self.config.blacklist.set(self.blacklist.to_list())
+        except Exception:
+            log.exception("Failed to save the spam blacklist.")
 
     def check(self, ctx):
-        user = self.blacklist.get(ctx.author.id)
-        if user is None:
-            return True
-        if self.blacklist[ctx.author.id]["expiry"] < datetime.now():
-            del self.blacklist[ctx.author.id]
-            log.debug(f"{ctx.author}({ctx.author.id}) has been removed from the spam blacklist.")
-            return True
-        return False
+        guild_id = ctx.guild.id if ctx.guild is not None else 0
+        return self.blacklist.get((guild_id, ctx.author.id)) is None
+
+    async def bypasses(self, author) -> bool:
+        """Whether author skips the spam filter, only asking the bot when not cached."""
+        guild = getattr(author, "guild", None)
+        guild_id = guild.id if guild is not None else None
+        roles = roles_hash(author)
+        bypass = self.bypass_cache.get(guild_id, author.id, roles)
+        if bypass is None:
+            bypass = await self.bot.is_owner(author) or bool(
+                self.config_cache["mod_bypass"] and await self.bot.is_mod(author)
+            )
+            self.bypass_cache.set(guild_id, author.id, roles, bypass)
+        return bypass
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before, after):
+        if before._roles != after._roles:
+            self.bypass_cache.invalidate_member(after.guild.id, after.id)
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role):
+        self.bypass_cache.invalidate_guild(role.guild.id)
+
+    @commands.Cog.listener()
+    async def on_command_completion(self, ctx):
+        if ctx.command.qualified_name in ROLE_COMMANDS:
+            if ctx.guild is None:
+                self.bypass_cache.clear()
+            else:
+                self.bypass_cache.invalidate_guild(ctx.guild.id)
 
     @commands.Cog.listener()
     async def on_command(self, ctx):
-        if await self.bot.is_owner(ctx.author) or (
-            self.config_cache["mod_bypass"] and await self.bot.is_mod(ctx.author)
-        ):
+        if await self.bypasses(ctx.author):
             return
         author = ctx.author
-        ctx.guild
-        now = datetime.now()
-        if author.id not in self.cache:
-            self.cache[author.id] = {"count": 1, "time": now}
-        else:
-            if now - self.cache[author.id]["time"] > timedelta(seconds=self.config_cache["per"]):
-                self.cache[author.id] = {"count": 1, "time": now}
-                return
-            self.cache[author.id]["count"] += 1
-            if (
-                self.cache[author.id]["count"] >= self.config_cache["amount"]
-                and author.id not in self.blacklist
-            ):
-                log.debug(
-                    f"{ctx.author}({ctx.author.id}) has been blacklisted from using commands for {self.config_cache['mute_length']} seconds."
-                )
-                expiry = datetime.now() + timedelta(seconds=self.config_cache["mute_length"])
-                self.blacklist[author.id] = {"id": author.id, "expiry": expiry}
-                await ctx.send(
-                    f"Slow down {ctx.author.name}! You're now on a {humanize_timedelta(seconds=self.config_cache['mute_length'])} cooldown from commands.",
-                    delete_after=self.config_cache["mute_length"],
-                )
+        # Direct messages are tracked under guild id 0.
+        guild_id = ctx.guild.id if ctx.guild is not None else 0
+        key = (guild_id, author.id)
+        # on_command fires before checks, so blacklisted users still get here.
+        if key in self.blacklist:
+            return
+        cost = self.command_cost(ctx.command)
+        if cost <= 0:
+            return
+        amount, per, mute_length = self.policies.get(guild_id, self.default_policy)
+        # The command that overdraws the bucket is the one that triggers the blacklist, so it
+        # holds one less than the amount. The first command of a window never triggers it, an
+        # amount of 1 acts like 2 just as it did before token buckets.
+        tokens = max(amount - 1, 1)
+        # A cost of the whole bucket or more empties it, so the command can run once and any
+        # command before the bucket has refilled, which takes the full window, overdraws it.
+        if self.limiter.hit(key, tokens, per, min(cost, tokens)):
+            log.debug(
+                f"{ctx.author}({ctx.author.id}) has been blacklisted from using commands for {mute_length} seconds."
+            )
+            self.limiter.reset(key)
+            self.blacklist.add(key, time.time() + mute_length)
+            self.save_event.set()
+            await ctx.send(
+                f"Slow down {ctx.author.name}! You're now on a {humanize_timedelta(seconds=mute_length)} cooldown from commands.",
+                delete_after=mute_length,
+            )
 
     @commands.is_owner()
     @commands.group()
@@ -98,7 +206,9 @@ class AntiSpam(commands.Cog):
 
     @antispamset.command()
     async def amount(self, ctx, amount: int):
-        """How many commands it takes to trigger a muting."""
+        """How many commands it takes to trigger a muting.
+
+        Commands with a cost use up that many commands from this amount."""
         if amount < 1:
             return await ctx.send("You must provide a value greater than 0.")
         await self.config.amount.set(amount)
@@ -118,6 +228,7 @@ class AntiSpam(commands.Cog):
         else:
             await ctx.send("Mods and admins will no longer bypass the filter.")
         await self.gen_cache()
+        self.bypass_cache.clear()
 
     @antispamset.command()
     async def list(self, ctx):
@@ -125,11 +236,12 @@ class AntiSpam(commands.Cog):
         if not self.blacklist:
             return await ctx.send("No users currently blacklisted.")
         msg = []
-        for user in self.blacklist:
-            if self.blacklist[user]["expiry"] > datetime.now():
-                msg.append(
-                    f"{self.bot.get_user(self.blacklist[user]['id'])}: {humanize_timedelta(timedelta=self.blacklist[user]['expiry'] - datetime.now())}"
-                )
+        now = time.time()
+        for (guild, user), expiry in self.blacklist.items():
+            guild = self.bot.get_guild(guild)
+            msg.append(
+                f"{self.bot.get_user(user)}{f' in {guild}' if guild is not None else ''}: {humanize_timedelta(timedelta=timedelta(seconds=expiry - now))}"
+            )
         if not msg:
             return await ctx.send("No users currently blacklisted.")
         for page in pagify("\n".join(msg)):
@@ -140,4 +252,81 @@ class AntiSpam(commands.Cog):
         """Show current antispam settings"""
         await self.gen_cache()
         msg = f"**Blacklist Length**: {humanize_timedelta(seconds=self.config_cache['mute_length'])}\n**Per** {humanize_timedelta(seconds=self.config_cache['per'])}\n**Amount**: {self.config_cache['amount']}\n**Mod/Admin Bypass**: {'Yes' if self.config_cache['mod_bypass'] else 'No'}"
+        if ctx.guild is not None and ctx.guild.id in self.policies:
+            amount, per, mute_length = self.policies[ctx.guild.id]
+            msg += f"\n\n**{ctx.guild.name}**\n**Blacklist Length**: {humanize_timedelta(seconds=mute_length)}\n**Per** {humanize_timedelta(seconds=per)}\n**Amount**: {amount}"
         await ctx.maybe_send_embed(msg)
+
+    @antispamset.command()
+    async def cost(self, ctx, name: CommandOrCog, cost: float = None):
+        """Set how much of the amount a command or every command in a cog uses up.
+
+        Commands cost 1 unless set otherwise, a cost of 0 exempts them from the filter.
+        A cost of one less than the amount or more allows the command once per timeframe, any
+        command used before the timeframe has passed since then triggers the blacklist.
+        Leave the cost empty to reset it."""
+        if cost is not None and cost < 0:
+            return await ctx.send("The cost can't be negative.")
+        async with self.config.costs() as costs:
+            if cost is None:
+                costs.pop(name, None)
+            else:
+                costs[name] = cost
+        await self.gen_cache()
+        if cost is None:
+            await ctx.send(f"`{name}` now uses the default cost.")
+        else:
+            await ctx.send(f"`{name}` now costs {cost}.")
+
+    @antispamset.command()
+    async def costs(self, ctx):
+        """Show the commands and cogs with a custom cost."""
+        costs = self.config_cache["costs"]
+        if not costs:
+            return await ctx.send("No commands or cogs have a custom cost.")
+        msg = "\n".join(f"`{name}`: {cost}" for name, cost in sorted(costs.items()))
+        for page in pagify(msg):
+            await ctx.maybe_send_embed(page)
+
+    @commands.guild_only()
+    @antispamset.group()
+    async def guild(self, ctx):
+        """Override the antispam settings for this server."""
+
+    @guild.command(name="length")
+    async def guild_length(self, ctx, *, length: TimedeltaConverter):
+        """How long to blacklist a user from using commands in this server."""
+        duration_seconds = length.total_seconds()
+        await self.config.guild(ctx.guild).mute_length.set(duration_seconds)
+        await ctx.send(
+            f"The spam filter blacklist timer for this server has been set to {humanize_timedelta(seconds=duration_seconds)}."
+        )
+        await self.gen_cache()
+
+    @guild.command(name="per")
+    async def guild_per(self, ctx, *, length: TimedeltaConverter):
+        """How long of a timeframe to keep track of command spamming in this server."""
+        duration_seconds = length.total_seconds()
+        await self.config.guild(ctx.guild).per.set(duration_seconds)
+        await ctx.send(
+            f"The spam filter for this server has been set to check commands during a {humanize_timedelta(seconds=duration_seconds)} period."
+        )
+        await self.gen_cache()
+
+    @guild.command(name="amount")
+    async def guild_amount(self, ctx, amount: int):
+        """How many commands it takes to trigger a muting in this server."""
+        if amount < 1:
+            return await ctx.send("You must provide a value greater than 0.")
+        await self.config.guild(ctx.guild).amount.set(amount)
+        await ctx.send(
+            f"The spam filter for this server will now check for {amount} commands during the configured time."
+        )
+        await self.gen_cache()
+
+    @guild.command(name="reset")
+    async def guild_reset(self, ctx):
+        """Use the global antispam settings in this server again."""
+        await self.config.guild(ctx.guild).clear()
+        await ctx.send("This server now uses the global spam filter settings.")
+        await self.gen_cache()
@@ -0,0 +1,101 @@
+"""Benchmark the owner/mod bypass check AntiSpam runs before every command, without Discord.
+
+Run from the repository root with ``python antispam/benchmark.py`` (or ``make bench``).
+``FakeBot`` mirrors the shape of Red's ``is_owner`` and ``is_mod``: mod and admin role ids are
+read from a Config-like store (which copies the value on every read) and compared with the
+member's roles. The uncached check from ``on_command`` is compared with ``BypassCache``.
+"""
+
+import asyncio
+import copy
+import random
+import time
+
+# The package imports redbot, so this only runs as a script.
+from bypass import BypassCache, roles_hash
+
+GUILDS = 50
+MEMBERS = 2000
+COMMANDS = 50000
+
+
+class FakeGuild:
+    def __init__(self, guild_id):
+        self.id = guild_id
+
+
+class FakeMember:
+    def __init__(self, member_id, guild, roles):
+        self.id = member_id
+        self.guild = guild
+        self._roles = sorted(roles)
+
+
+class FakeBot:
+    def __init__(self, owners, settings):
+        self.owner_ids = owners
+        self.settings = settings
+
+    async def get_setting(self, guild_id, key):
+        return copy.deepcopy(self.settings[guild_id][key])
+
+    async def is_owner(self, user):
+        return user.id in self.owner_ids
+
+    async def is_admin(self, member):
+        for role in await self.get_setting(member.guild.id, "admin_role"):
+            if role in member._roles:
+                return True
+        return False
+
+    async def is_mod(self, member):
+        if await self.is_admin(member):
+            return True
+        for role in await self.get_setting(member.guild.id, "mod_role"):
+            if role in member._roles:
+                return True
+        return False
+
+
+async def uncached(bot, cache, member):
+    """The check on_command used before the bypass cache."""
+    return await bot.is_owner(member) or await bot.is_mod(member)
+
+
+async def cached(bot, cache, member):
+    """AntiSpam.bypasses, minus the cog."""
+    roles = roles_hash(member)
+    bypass = cache.get(member.guild.id, member.id, roles)
+    if bypass is None:
+        bypass = await bot.is_owner(member) or await bot.is_mod(member)
+        cache.set(member.guild.id, member.id, roles, bypass)
+    return bypass
+
+
+async def main():
+    rng = random.Random(0)
+    guilds = [FakeGuild(guild_id) for guild_id in range(GUILDS)]
+    bot = FakeBot(
+        {0},
+        {
+            guild.id: {
+                "admin_role": rng.sample(range(1000), 3),
+                "mod_role": rng.sample(range(1000), 3),
+            }
+            for guild in guilds
+        },
+    )
+    members = [
+        FakeMember(member_id, rng.choice(guilds), rng.sample(range(1000), 10))
+        for member_id in range(MEMBERS)
+    ]
+    for name, func in (("uncached", uncached), ("cached", cached)):
+        cache = BypassCache()
+        start = time.perf_counter()
+        for index in range(COMMANDS):
+            await func(bot, cache, members[index % MEMBERS])
+        print(f"{name}: {(time.perf_counter() - start) / COMMANDS * 1e6:.2f}us per command")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,59 @@
+import time
+from typing import Dict, Optional, Tuple
+
+# How long a bypass decision is trusted for when no event invalidated it first.
+BYPASS_TTL = 300
+
+
+def roles_hash(member) -> int:
+    """Hash of a member's role ids, users outside of a guild have none."""
+    # Member._roles is kept sorted, so it hashes the same for the same set of roles.
+    return hash(tuple(getattr(member, "_roles", ())))
+
+
+class BypassCache:
+    """Cached owner/mod bypass decisions per (guild, member).
+
+    A decision is only reused while the member's role set hashes the same as when it was made
+    and its TTL hasn't run out, so role changes that were missed still expire eventually.
+    """
+
+    def __init__(self, ttl: float = BYPASS_TTL):
+        self.ttl = ttl
+        self.entries: Dict[Tuple[Optional[int], int], Tuple[int, bool, float]] = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(
+        self, guild: Optional[int], member: int, roles: int, now: float = None
+    ) -> Optional[bool]:
+        entry = self.entries.get((guild, member))
+        if entry is None:
+            return None
+        if entry[0] != roles or entry[2] <= (time.monotonic() if now is None else now):
+            del self.entries[(guild, member)]
+            return None
+        return entry[1]
+
+    def set(self, guild: Optional[int], member: int, roles: int, bypass: bool, now: float = None):
+        now = time.monotonic() if now is None else now
+        self.entries[(guild, member)] = (roles, bypass, now + self.ttl)
+
+    def invalidate_member(self, guild: Optional[int], member: int):
+        self.entries.pop((guild, member), None)
+
+    def invalidate_guild(self, guild: int):
+        for key in [key for key in self.entries if key[0] == guild]:
+            del self.entries[key]
+
+    def clear(self):
+        self.entries.clear()
+
+    def sweep(self, now: float = None) -> int:
+        """Drop expired decisions, returning how many were removed."""
+        now = time.monotonic() if now is None else now
+        expired = [key for key, entry in self.entries.items() if entry[2] <= now]
+        for key in expired:
+            del self.entries[key]
+        return len(expired)
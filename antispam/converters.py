@@ -0,0 +1,13 @@
+from redbot.core.commands import BadArgument, Context
+
+
+class CommandOrCog:
+    @classmethod
+    async def convert(cls, ctx: Context, argument: str):
+        command = ctx.bot.get_command(argument)
+        if command is not None:
+            return command.qualified_name
+        cog = ctx.bot.get_cog(argument)
+        if cog is not None:
+            return cog.qualified_name
+        raise BadArgument(f"No command or cog called `{argument}` could be found.")
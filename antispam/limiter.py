@@ -0,0 +1,136 @@
+import heapq
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterator, List, Optional, Tuple
+
+
+class TokenBucket:
+    """Tokens left for a single user, refilled continuously over time."""
+
+    __slots__ = ("tokens", "updated", "per")
+
+    def __init__(self, tokens: float, updated: float, per: float):
+        self.tokens = tokens
+        self.updated = updated
+        self.per = per
+
+
+class RateLimiter:
+    """Token bucket limiter holding only the users who used a command recently.
+
+    A bucket holds ``amount`` tokens and refills ``amount`` tokens every ``per`` seconds, so
+    overdrawing it takes more than ``amount`` commands inside a sliding ``per`` second window.
+    Buckets are kept in the order they were last used; a bucket that has been idle for its whole
+    window is full again, which is the same as not having one, so ``sweep`` drops those from the
+    front.
+    """
+
+    def __init__(self):
+        self.buckets: "OrderedDict[Hashable, TokenBucket]" = OrderedDict()
+
+    def __len__(self):
+        return len(self.buckets)
+
+    def hit(
+        self, key: Hashable, amount: float, per: float, cost: float = 1, now: float = None
+    ) -> bool:
+        """Spend cost tokens from key's bucket, returning whether that overdrew it."""
+        if now is None:
+            now = time.monotonic()
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(amount, now, per)
+        else:
+            self.buckets.move_to_end(key)
+            if per > 0:
+                bucket.tokens = min(amount, bucket.tokens + (now - bucket.updated) * amount / per)
+            else:
+                bucket.tokens = amount
+            bucket.updated = now
+            bucket.per = per
+        bucket.tokens -= cost
+        return bucket.tokens < -1e-9
+
+    def reset(self, key: Hashable):
+        self.buckets.pop(key, None)
+
+    def sweep(self, now: float = None) -> int:
+        """Drop buckets that have refilled, returning how many were removed."""
+        if now is None:
+            now = time.monotonic()
+        removed = 0
+        while self.buckets:
+            key, bucket = next(iter(self.buckets.items()))
+            if now - bucket.updated < bucket.per:
+                break
+            del self.buckets[key]
+            removed += 1
+        return removed
+
+
+class Blacklist:
+    """User ids mapped to the unix time their blacklist expires, with a heap for expiry."""
+
+    def __init__(self):
+        self.expiries: Dict[Hashable, float] = {}
+        self.heap: List[Tuple[float, Hashable]] = []
+
+    def __len__(self):
+        return len(self.expiries)
+
+    def __contains__(self, key: Hashable):
+        return self.get(key) is not None
+
+    def add(self, key: Hashable, expiry: float):
+        self.expiries[key] = expiry
+        heapq.heappush(self.heap, (expiry, key))
+
+    def get(self, key: Hashable, now: float = None) -> Optional[float]:
+        """Return the expiry of key, forgetting it if it has already passed."""
+        expiry = self.expiries.get(key)
+        if expiry is None:
+            return None
+        if expiry <= (time.time() if now is None else now):
+            del self.expiries[key]
+            return None
+        return expiry
+
+    def items(self) -> Iterator[Tuple[Hashable, float]]:
+        now = time.time()
+        for key, expiry in self.expiries.items():
+            if expiry > now:
+                yield key, expiry
+
+    def to_list(self) -> List[list]:
+        """Return the active entries as ``[expiry, *key]`` lists, soonest to expire first."""
+        return [
+            [int(expiry) + 1, *key] for key, expiry in sorted(self.items(), key=lambda t: t[1])
+        ]
+
+    def load(self, entries: List[list], now: float = None) -> int:
+        """Add entries saved by to_list that haven't expired, returning how many were added.
+
+        Keys that are already blacklisted keep their current expiry.
+        """
+        if now is None:
+            now = time.time()
+        added = 0
+        for expiry, *key in entries:
+            key = tuple(key)
+            if expiry > now and key not in self.expiries:
+                self.add(key, expiry)
+                added += 1
+        return added
+
+    def sweep(self, now: float = None) -> List[Hashable]:
+        """Remove every expired entry, returning the keys that were removed."""
+        if now is None:
+            now = time.time()
+        removed = []
+        while self.heap and self.heap[0][0] <= now:
+            expiry, key = heapq.heappop(self.heap)
+            # Entries removed early by get() or re-added leave stale items behind.
+            if self.expiries.get(key) == expiry:
+                del self.expiries[key]
+                removed.append(key)
+        return removed
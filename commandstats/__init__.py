@@ -1,5 +1,7 @@
 from .commandstats import CommandStats
 
 
-def setup(bot):
-    bot.add_cog(CommandStats(bot))
+async def setup(bot):
+    cog = CommandStats(bot)
+    await cog.initialize()
+    bot.add_cog(cog)
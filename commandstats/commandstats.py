@@ -1,15 +1,29 @@
 import asyncio
+import contextlib
 import datetime
+import logging
+import time
+import weakref
 from collections import OrderedDict
-from copy import deepcopy
-from typing import Counter, Optional
+from typing import Counter, List, Optional
 
 import discord
 import tabulate
 from redbot.core import Config, commands
-from redbot.core.utils.chat_formatting import box
+from redbot.core.commands.converter import TimedeltaConverter
+from redbot.core.utils.chat_formatting import box, humanize_timedelta
 from redbot.core.utils.menus import DEFAULT_CONTROLS, menu
 
+from .history import DAILY_BUCKETS, Series, UsageHistory, current_day, current_hour
+from .latency import LatencyHistogram
+from .leaderboard import Leaderboard
+from .metrics import MetricsServer, collapse, metric
+
+log = logging.getLogger("red.flare.commandstats")
+
+HISTORY_SAVE_INTERVAL = 3600
+GUILD_BOARD_CACHE = 100
+
 
 def chunks(l, n):
     """Yield successive n-sized chunks from l."""
@@ -20,7 +34,7 @@ def chunks(l, n):
 class CommandStats(commands.Cog):
     """Command Statistics."""
 
-    __version__ = "0.0.4"
+    __version__ = "0.5.0"
 
     def format_help_for_context(self, ctx):
         """Thanks Sinbad."""
@@ -30,15 +44,236 @@ class CommandStats(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.config = Config.get_conf(self, 1398467138476, force_registration=True)
-        default_global = {"globaldata": Counter({}), "guilddata": {}}
+        default_global = {
+            "globaldata": Counter({}),
+            "guilddata": {},
+            "commands": [],
+            "counts": {},
+            "migrated": False,
+            "flush_interval": 300,
+            "flush_threshold": 1000,
+            "history": {},
+            "metrics": {"port": None, "host": "127.0.0.1", "commands": 100, "guilds": 50},
+        }
         self.config.register_global(**default_global)
+        self.config.register_guild(counts={}, history=[])
         self.cache = {"guild": {}, "session": Counter({})}
-        self.session = Counter()
+        self.command_ids = {}
+        self.command_names = []
+        self.saved_commands = 0
+        self.dirty = 0
+        self.flush_interval = 300
+        self.flush_threshold = 1000
+        self.flush_event = asyncio.Event()
+        self.flush_lock = asyncio.Lock()
+        self.flush_task: Optional[asyncio.Task] = None
+        self.history = UsageHistory()
+        self.latencies = {}
+        self.totals = Leaderboard()
+        self.guild_boards = OrderedDict()
+        self.guild_totals = Counter()
+        self.metrics_settings = {}
+        self.metrics_server = MetricsServer(self.render_metrics)
+        self.started = weakref.WeakKeyDictionary()
+        self.history_saved = time.monotonic()
+        self.session = Leaderboard()
         self.session_time = datetime.datetime.utcnow()
 
+    async def initialize(self):
+        self.command_names = await self.config.commands()
+        self.command_ids = {name: index for index, name in enumerate(self.command_names)}
+        self.saved_commands = len(self.command_names)
+        self.flush_interval = await self.config.flush_interval()
+        self.flush_threshold = await self.config.flush_threshold()
+        await self.migrate_config()
+        self.history.commands = {
+            self.command_names[int(command_id)]: Series(data)
+            for command_id, data in (await self.config.history()).items()
+        }
+        self.totals = Leaderboard(self.resolve_counts(await self.config.counts()))
+        self.flush_task = self.bot.loop.create_task(self.flush_loop())
+        self.metrics_settings = await self.config.metrics()
+        if self.metrics_settings["port"] is not None:
+            await self.start_metrics()
+
+    async def migrate_config(self):
+        """Move the name keyed globaldata/guilddata blobs to interned, per guild records."""
+        if await self.config.migrated():
+            return
+        globaldata = await self.config.globaldata()
+        guilddata = await self.config.guilddata()
+        counts = self.intern_counts(globaldata)
+        guild_counts = {guild: self.intern_counts(data) for guild, data in guilddata.items()}
+        await self.save_commands()
+        await self.config.counts.set(counts)
+        for guild, data in guild_counts.items():
+            await self.config.guild_from_id(int(guild)).counts.set(data)
+        await self.config.globaldata.clear()
+        await self.config.guilddata.clear()
+        await self.config.migrated.set(True)
+        log.info("Migration complete.")
+
+    def intern(self, name: str) -> int:
+        """Return the id a command name is stored under, assigning one if needed."""
+        command_id = self.command_ids.get(name)
+        if command_id is None:
+            command_id = self.command_ids[name] = len(self.command_names)
+            self.command_names.append(name)
+        return command_id
+
+    def intern_counts(self, data: dict) -> dict:
+        return {str(self.intern(name)): amount for name, amount in data.items()}
+
+    def resolve_counts(self, data: dict) -> Counter:
+        return Counter({self.command_names[int(key)]: amount for key, amount in data.items()})
+
+    async def save_commands(self):
+        if len(self.command_names) != self.saved_commands:
+            names = list(self.command_names)
+            await self.config.commands.set(names)
+            self.saved_commands = len(names)
+
     def cog_unload(self):
-        asyncio.create_task(self.update_data())
-        asyncio.create_task(self.update_global())
+        # Cancelling the loop runs the final flush, see flush_loop.
+        if self.flush_task:
+            self.flush_task.cancel()
+        else:
+            self.bot.loop.create_task(self.flush())
+        self.bot.loop.create_task(self.metrics_server.stop())
+
+    async def start_metrics(self) -> bool:
+        await self.metrics_server.stop()
+        try:
+            await self.metrics_server.start(
+                self.metrics_settings["host"], self.metrics_settings["port"]
+            )
+        except OSError as exc:
+            log.error("Unable to start the command stats metrics server: ", exc_info=exc)
+            return False
+        return True
+
+    def render_metrics(self) -> str:
+        """Render the in memory counters in the OpenMetrics text format."""
+        commands_limit = self.metrics_settings["commands"]
+        guilds_limit = self.metrics_settings["guilds"]
+        errors = {name: histogram.errors for name, histogram in self.latencies.items()}
+        guilds = {str(guild): amount for guild, amount in self.guild_totals.items()}
+        blocks = [
+            metric(
+                "commandstats_commands",
+                "Commands used since stats began.",
+                "command",
+                collapse(self.totals, commands_limit),
+            ),
+            metric(
+                "commandstats_session_commands",
+                "Commands used since the cog was loaded.",
+                "command",
+                collapse(self.session, commands_limit),
+            ),
+            metric(
+                "commandstats_guild_commands",
+                "Commands used per guild since the cog was loaded.",
+                "guild",
+                collapse(guilds, guilds_limit),
+            ),
+            metric(
+                "commandstats_command_errors",
+                "Failed command invocations since the cog was loaded.",
+                "command",
+                collapse(errors, commands_limit),
+            ),
+        ]
+        return "\n".join(blocks) + "\n# EOF\n"
+
+    async def flush_loop(self):
+        try:
+            while True:
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self.flush_event.wait(), timeout=self.flush_interval)
+                self.flush_event.clear()
+                try:
+                    await self.flush()
+                    if time.monotonic() - self.history_saved >= HISTORY_SAVE_INTERVAL:
+                        await self.save_history()
+                except Exception as exc:
+                    log.error("Exception occured while flushing command stats: ", exc_info=exc)
+        except asyncio.CancelledError:
+            # Shielded so the last writes still finish if whatever cancelled us is cancelled too.
+            try:
+                await asyncio.shield(self.final_flush())
+            except Exception as exc:
+                log.error("Exception occured while flushing command stats: ", exc_info=exc)
+            raise
+
+    async def final_flush(self):
+        await self.flush()
+        await self.save_history()
+
+    async def flush(self):
+        """Write a snapshot of the pending counters to Config.
+
+        The pending counters are swapped out before anything is awaited so record() never waits
+        on a flush. Counts that fail to be written, or whose write is cancelled, are merged back
+        to be retried on the next one.
+        """
+        async with self.flush_lock:
+            guilds, self.cache["guild"] = self.cache["guild"], {}
+            session, self.cache["session"] = self.cache["session"], Counter({})
+            self.dirty = 0
+            if not guilds and not session:
+                return
+            try:
+                for guild in list(guilds):
+                    await self.write_counts(
+                        self.config.guild_from_id(int(guild)).counts, guilds[guild]
+                    )
+                    del guilds[guild]
+                await self.write_counts(self.config.counts, session)
+                session = Counter()
+            except BaseException:
+                for guild, data in guilds.items():
+                    self.cache["guild"][guild] = self.cache["guild"].get(guild, Counter()) + data
+                self.cache["session"] += session
+                raise
+
+    async def load_guild_history(self, guild: int) -> Series:
+        """Return a guild's usage series, merging in the stored one on first use."""
+        if guild not in self.history.loaded_guilds:
+            stored = Series(await self.config.guild_from_id(guild).history())
+            if guild not in self.history.loaded_guilds:
+                series = self.history.guilds.get(guild)
+                if series is not None:
+                    stored.merge(series)
+                self.history.guilds[guild] = stored
+                self.history.loaded_guilds.add(guild)
+        return self.history.guilds[guild]
+
+    async def save_history(self):
+        """Write the hourly and daily usage series, guild series only if they changed."""
+        self.history_saved = time.monotonic()
+        if not self.history.dirty:
+            return
+        self.history.dirty = False
+        guilds, self.history.dirty_guilds = self.history.dirty_guilds, set()
+        data = {
+            str(self.intern(name)): series.to_list()
+            for name, series in self.history.commands.items()
+        }
+        await self.save_commands()
+        await self.config.history.set(data)
+        for guild in guilds:
+            series = await self.load_guild_history(guild)
+            await self.config.guild_from_id(guild).history.set(series.to_list())
+
+    async def write_counts(self, group, data: Counter):
+        data = self.intern_counts(data)
+        # Ids of new commands have to be stored before any counts that use them, or a restart
+        # in between would find counts it can't resolve.
+        await self.save_commands()
+        async with group() as counts:
+            for command_id, amount in data.items():
+                counts[command_id] = counts.get(command_id, 0) + amount
 
     def record(self, ctx, name):
         guild = ctx.message.guild
@@ -54,16 +289,44 @@ class CommandStats(commands.Cog):
                 self.cache["session"][name] = 1
             else:
                 self.cache["session"][name] += 1
-            if name not in self.session:
-                self.session[name] = 1
-            else:
-                self.session[name] += 1
+            self.session.increment(name)
+            self.history.record(name, guild.id if guild is not None else None)
+            self.totals.increment(name)
+            if guild is not None:
+                self.guild_totals[guild.id] += 1
+                if guild.id in self.guild_boards:
+                    self.guild_boards[guild.id].increment(name)
+            self.dirty += 1
+            if self.dirty >= self.flush_threshold:
+                self.flush_event.set()
 
     @commands.Cog.listener()
     async def on_command(self, ctx):
         """Record standard command events."""
         name = str(ctx.command)
         self.record(ctx, name)
+        if not ctx.author.bot:
+            self.started[ctx] = time.perf_counter()
+
+    @commands.Cog.listener()
+    async def on_command_completion(self, ctx):
+        self.record_latency(ctx, False)
+
+    @commands.Cog.listener()
+    async def on_command_error(self, ctx, error):
+        self.record_latency(ctx, isinstance(error, commands.CommandInvokeError))
+
+    def record_latency(self, ctx, failed: bool):
+        start = self.started.pop(ctx, None)
+        if start is None:
+            return
+        name = str(ctx.command)
+        histogram = self.latencies.get(name)
+        if histogram is None:
+            histogram = self.latencies[name] = LatencyHistogram()
+        histogram.add((time.perf_counter() - start) * 1000)
+        if failed:
+            histogram.errors += 1
 
     @commands.Cog.listener()
     async def on_commandstats_action(self, ctx):
@@ -74,41 +337,14 @@ class CommandStats(commands.Cog):
     @commands.is_owner()
     @commands.group(invoke_without_command=True)
     async def cmd(self, ctx, *, command: str = None):
-        """Group command for command stats.
-
-        This command does not log the issuing command.
-        """
-        await self.update_global()
-        data = await self.config.globaldata()
-        if not data:
+        """Group command for command stats."""
+        if not self.totals:
             return await ctx.send("No commands have been used yet.")
         if command is None:
-            data = OrderedDict(sorted(data.items(), key=lambda t: t[1], reverse=True))
-            stats = []
-            for cmd, amount in data.items():
-                stats.append([f"{cmd}", f"{amount} time{'s' if amount > 1 else ''}!"])
-            a = chunks(stats, 15)
-            embeds = []
-            for items in a:
-                stats = []
-                for item in items:
-                    stats.append(item)
-                embed = discord.Embed(
-                    title="Commands used",
-                    colour=await self.bot.get_embed_color(ctx.channel),
-                    description=box(
-                        tabulate.tabulate(stats, headers=["Command", "Times Used"]), lang="prolog"
-                    ),
-                )
-                embeds.append(embed)
-            if len(embeds) == 1:
-                await ctx.send(embed=embeds[0])
-            else:
-                await menu(ctx, embeds, DEFAULT_CONTROLS)
-
+            await self.send_leaderboard(ctx, self.totals, "Commands used")
         else:
-            if command in data:
-                await ctx.send(f"`{command}` has been used {data[command]} times!")
+            if command in self.totals.counts:
+                await ctx.send(f"`{command}` has been used {self.totals.get(command)} times!")
             else:
                 await ctx.send(f"`{command}` hasn't been used yet!")
 
@@ -123,39 +359,16 @@ class CommandStats(commands.Cog):
         """Guild Command Stats."""
         if not server:
             server = ctx.guild
-        await self.update_data()
-        data = await self.config.guilddata()
-        data = data[str(server.id)]
+        data = await self.guild_board(server.id)
         if not data:
             return await ctx.send(f"No commands have been used in {server.name} yet.")
         if command is None:
-            data = OrderedDict(sorted(data.items(), key=lambda t: t[1], reverse=True))
-            stats = []
-            for cmd, amount in data.items():
-                stats.append([f"{cmd}", f"{amount} time{'s' if amount > 1 else ''}!"])
-            a = chunks(stats, 15)
-            embeds = []
-            for items in a:
-                stats = []
-                for item in items:
-                    stats.append(item)
-                embed = discord.Embed(
-                    title=f"Commands used in {server.name}",
-                    colour=await self.bot.get_embed_color(ctx.channel),
-                    description=box(
-                        tabulate.tabulate(stats, headers=["Command", "Times Used"]), lang="prolog"
-                    ),
-                )
-                embeds.append(embed)
-            if len(embeds) == 1:
-                await ctx.send(embed=embeds[0])
-            else:
-                await menu(ctx, embeds, DEFAULT_CONTROLS)
-
+            await self.send_leaderboard(ctx, data, f"Commands used in {server.name}")
         else:
-            if command in data:
+            if command in data.counts:
+                amount = data.get(command)
                 await ctx.send(
-                    f"`{command}` has been used {data[command]} time{'s' if data[command] > 1 else ''} in {ctx.guild}!"
+                    f"`{command}` has been used {amount} time{'s' if amount > 1 else ''} in {server.name}!"
                 )
             else:
                 await ctx.send(f"`{command}` hasn't been used in {server.name}!")
@@ -163,60 +376,269 @@ class CommandStats(commands.Cog):
     @cmd.command()
     async def session(self, ctx, *, command: str = None):
         """Session command stats."""
-        data = deepcopy(self.session)
-        if str(ctx.command) in data:
-            data[str(ctx.command)] += 1
-        else:
-            data[str(ctx.command)] = 1
+        data = self.session
         if not data:
             return await ctx.send("No commands have been used in this session")
         if command is None:
-            data = OrderedDict(sorted(data.items(), key=lambda t: t[1], reverse=True))
-            stats = []
-            for cmd, amount in data.items():
-                stats.append([f"{cmd}", f"{amount} time{'s' if amount > 1 else ''}!"])
-            a = chunks(stats, 15)
-            embeds = []
-            for items in a:
-                stats = []
-                for item in items:
-                    stats.append(item)
-                embed = discord.Embed(
-                    title="Commands used in this session",
-                    colour=await self.bot.get_embed_color(ctx.channel),
-                    description=box(
-                        tabulate.tabulate(stats, headers=["Command", "Times Used"]), lang="prolog"
-                    ),
-                    timestamp=self.session_time,
-                )
-                embed.set_footer(text="Recording sessions commands since")
-                embeds.append(embed)
-            if len(embeds) == 1:
-                await ctx.send(embed=embeds[0])
-            else:
-                await menu(ctx, embeds, DEFAULT_CONTROLS)
-
+            await self.send_leaderboard(
+                ctx,
+                data,
+                "Commands used in this session",
+                timestamp=self.session_time,
+                footer="Recording sessions commands since",
+            )
         else:
-            if command in data:
+            if command in data.counts:
+                amount = data.get(command)
                 await ctx.send(
-                    f"`{command}` has been used {data[command]} time{'s' if data[command] > 1 else ''} in this session!"
+                    f"`{command}` has been used {amount} time{'s' if amount > 1 else ''} in this session!"
                 )
             else:
                 await ctx.send(f"`{command}` hasn't been used in this session!")
 
-    async def update_data(self):
-        async with self.config.guilddata() as guilddata:
-            for guild in self.cache["guild"]:
-                if guild in guilddata:
-                    olddata = Counter(guilddata[guild])
-                else:
-                    olddata = Counter({})
-                data = Counter(olddata + self.cache["guild"][guild])
-                self.cache["guild"][guild] = Counter()
-                guilddata[guild] = data
+    async def guild_board(self, guild: int) -> Leaderboard:
+        """Return a guild's leaderboard, loading it from Config if it isn't cached."""
+        board = self.guild_boards.get(guild)
+        if board is not None:
+            self.guild_boards.move_to_end(guild)
+            return board
+        # Holding the flush lock keeps pending counts from moving to Config while loading.
+        async with self.flush_lock:
+            board = self.guild_boards.get(guild)
+            if board is None:
+                counts = self.resolve_counts(await self.config.guild_from_id(guild).counts())
+                counts += self.cache["guild"].get(str(guild), Counter())
+                board = self.guild_boards[guild] = Leaderboard(counts)
+                while len(self.guild_boards) > GUILD_BOARD_CACHE:
+                    self.guild_boards.popitem(last=False)
+        return board
 
-    async def update_global(self):
-        globaldata = await self.config.globaldata()
-        data = globaldata + self.cache["session"]
-        await self.config.globaldata.set(data)
-        self.cache["session"] = Counter({})
+    async def send_leaderboard(
+        self, ctx, board: Leaderboard, title: str, *, footer: str = None, **kwargs
+    ):
+        if board.stale():
+            stats = [
+                [f"{cmd}", f"{amount} time{'s' if amount > 1 else ''}!"]
+                for cmd, amount in board.items()
+            ]
+            board.pages = [
+                box(tabulate.tabulate(items, headers=["Command", "Times Used"]), lang="prolog")
+                for items in chunks(stats, 15)
+            ]
+            board.changes = 0
+        colour = await self.bot.get_embed_color(ctx.channel)
+        embeds = []
+        for page in board.pages:
+            embed = discord.Embed(title=title, colour=colour, description=page, **kwargs)
+            if footer is not None:
+                embed.set_footer(text=footer)
+            embeds.append(embed)
+        if len(embeds) == 1:
+            await ctx.send(embed=embeds[0])
+        else:
+            await menu(ctx, embeds, DEFAULT_CONTROLS)
+
+    @cmd.command()
+    async def top(
+        self,
+        ctx,
+        amount: Optional[int] = 10,
+        *,
+        window: TimedeltaConverter(
+            minimum=datetime.timedelta(hours=1),
+            maximum=datetime.timedelta(days=DAILY_BUCKETS),
+            default_unit="hours",
+        ) = None,
+    ):
+        """Most used commands over a recent window.
+
+        The window defaults to the last day and can be up to 90 days.
+        """
+        window = window or datetime.timedelta(days=1)
+        hours = max(1, int(window.total_seconds() // 3600))
+        data = self.history.top(hours).most_common(max(1, amount))
+        if not data:
+            return await ctx.send("No commands have been used in that window.")
+        stats = [[cmd, f"{amount} time{'s' if amount > 1 else ''}!"] for cmd, amount in data]
+        embeds = []
+        for items in chunks(stats, 15):
+            embed = discord.Embed(
+                title=f"Top commands over the last {humanize_timedelta(timedelta=window)}",
+                colour=await self.bot.get_embed_color(ctx.channel),
+                description=box(
+                    tabulate.tabulate(items, headers=["Command", "Times Used"]), lang="prolog"
+                ),
+            )
+            embeds.append(embed)
+        if len(embeds) == 1:
+            await ctx.send(embed=embeds[0])
+        else:
+            await menu(ctx, embeds, DEFAULT_CONTROLS)
+
+    @cmd.command()
+    async def trend(self, ctx, days: Optional[int] = 7, *, command: str):
+        """Usage of a command per day over the last days.
+
+        Passing 1 day shows usage per hour instead.
+        """
+        if not 1 <= days <= DAILY_BUCKETS:
+            return await ctx.send(f"You must provide between 1 and {DAILY_BUCKETS} days.")
+        counts = self.history.trend(self.history.commands.get(command), days)
+        await self.send_trend(ctx, f"Usage of {command}", counts, days)
+
+    @cmd.command()
+    async def guildtrend(
+        self,
+        ctx,
+        days: Optional[int] = 7,
+        server: Optional[commands.converter.GuildConverter] = None,
+    ):
+        """Commands used in a guild per day over the last days.
+
+        Passing 1 day shows usage per hour instead.
+        """
+        if not 1 <= days <= DAILY_BUCKETS:
+            return await ctx.send(f"You must provide between 1 and {DAILY_BUCKETS} days.")
+        server = server or ctx.guild
+        if server is None:
+            return await ctx.send("You must provide a server when not used in one.")
+        counts = self.history.trend(await self.load_guild_history(server.id), days)
+        await self.send_trend(ctx, f"Commands used in {server.name}", counts, days)
+
+    @cmd.command()
+    async def latency(self, ctx, amount: int = 50):
+        """Command latency and errors this session, slowest first.
+
+        Commands are sorted by their 99th percentile latency.
+        """
+        data = sorted(self.latencies.items(), key=lambda t: t[1].percentile(99), reverse=True)
+        data = data[: max(1, amount)]
+        if not data:
+            return await ctx.send("No commands have finished in this session.")
+        stats = [
+            [
+                cmd,
+                histogram.count,
+                f"{histogram.percentile(50):.0f}",
+                f"{histogram.percentile(95):.0f}",
+                f"{histogram.percentile(99):.0f}",
+                histogram.errors,
+            ]
+            for cmd, histogram in data
+        ]
+        embeds = []
+        for items in chunks(stats, 15):
+            embed = discord.Embed(
+                title="Command latency in this session (ms)",
+                colour=await self.bot.get_embed_color(ctx.channel),
+                description=box(
+                    tabulate.tabulate(
+                        items, headers=["Command", "Uses", "p50", "p95", "p99", "Errors"]
+                    ),
+                    lang="prolog",
+                ),
+                timestamp=self.session_time,
+            )
+            embed.set_footer(text="Recording sessions commands since")
+            embeds.append(embed)
+        if len(embeds) == 1:
+            await ctx.send(embed=embeds[0])
+        else:
+            await menu(ctx, embeds, DEFAULT_CONTROLS)
+
+    async def send_trend(self, ctx, title: str, counts: List[int], days: int):
+        if days == 1:
+            first, step, fmt, header = current_hour() - 23, 3600, "%H:00", "Hour (UTC)"
+        else:
+            first, step, fmt, header = current_day() - days + 1, 86400, "%Y-%m-%d", "Day"
+        peak = max(counts) or 1
+        stats = [
+            [
+                datetime.datetime.utcfromtimestamp((first + index) * step).strftime(fmt),
+                count,
+                "#" * round(count / peak * 20),
+            ]
+            for index, count in enumerate(counts)
+        ]
+        embeds = []
+        for items in chunks(stats, 15):
+            embed = discord.Embed(
+                title=title,
+                colour=await self.bot.get_embed_color(ctx.channel),
+                description=box(
+                    tabulate.tabulate(items, headers=[header, "Uses", ""]), lang="prolog"
+                ),
+            )
+            embed.set_footer(text=f"{sum(counts)} uses in total")
+            embeds.append(embed)
+        if len(embeds) == 1:
+            await ctx.send(embed=embeds[0])
+        else:
+            await menu(ctx, embeds, DEFAULT_CONTROLS)
+
+    @commands.is_owner()
+    @commands.group()
+    async def cmdset(self, ctx):
+        """Settings for command stats."""
+
+    @cmdset.command()
+    async def interval(
+        self,
+        ctx,
+        *,
+        interval: TimedeltaConverter(
+            minimum=datetime.timedelta(seconds=30),
+            maximum=datetime.timedelta(hours=6),
+            default_unit="seconds",
+        ),
+    ):
+        """How often pending command stats are saved."""
+        self.flush_interval = interval.total_seconds()
+        await self.config.flush_interval.set(self.flush_interval)
+        await ctx.send(
+            f"Command stats will be saved every {humanize_timedelta(timedelta=interval)}."
+        )
+
+    @cmdset.command()
+    async def threshold(self, ctx, amount: int):
+        """How many unsaved commands trigger an early save."""
+        if amount < 1:
+            return await ctx.send("You must provide a value greater than 0.")
+        self.flush_threshold = amount
+        await self.config.flush_threshold.set(amount)
+        await ctx.send(f"Command stats will be saved early once {amount} commands are pending.")
+
+    @cmdset.command()
+    async def metrics(self, ctx, port: int = None, host: str = "127.0.0.1"):
+        """Serve command stats in the OpenMetrics format for Prometheus.
+
+        Metrics are served on http://host:port/metrics. Not passing a port turns the endpoint
+        off. The host defaults to 127.0.0.1, only listen on other interfaces if you need to.
+        """
+        if port is None:
+            await self.config.metrics.port.set(None)
+            self.metrics_settings["port"] = None
+            await self.metrics_server.stop()
+            return await ctx.send("The metrics endpoint has been turned off.")
+        if not 1 <= port <= 65535:
+            return await ctx.send("You must provide a valid port.")
+        self.metrics_settings["port"] = port
+        self.metrics_settings["host"] = host
+        if not await self.start_metrics():
+            return await ctx.send(f"Unable to listen on {host}:{port}, check your logs.")
+        await self.config.metrics.port.set(port)
+        await self.config.metrics.host.set(host)
+        await ctx.send(f"Metrics are now served on http://{host}:{port}/metrics.")
+
+    @cmdset.command()
+    async def metricslimit(self, ctx, commands_limit: int, guilds_limit: int):
+        """How many commands and guilds are exported before the rest are grouped as other."""
+        if commands_limit < 1 or guilds_limit < 1:
+            return await ctx.send("You must provide values greater than 0.")
+        self.metrics_settings["commands"] = commands_limit
+        self.metrics_settings["guilds"] = guilds_limit
+        await self.config.metrics.commands.set(commands_limit)
+        await self.config.metrics.guilds.set(guilds_limit)
+        await ctx.send(
+            f"Metrics will include the top {commands_limit} commands and {guilds_limit} guilds."
+        )
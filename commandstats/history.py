@@ -0,0 +1,130 @@
+import time
+from array import array
+from typing import Counter, Dict, List, Optional, Set
+
+HOURLY_BUCKETS = 24 * 7
+DAILY_BUCKETS = 90
+
+
+def current_hour() -> int:
+    return int(time.time() // 3600)
+
+
+def current_day() -> int:
+    return int(time.time() // 86400)
+
+
+class RingSeries:
+    """Counts for the last ``size`` time buckets.
+
+    Buckets are absolute (hours or days since the epoch), slots of buckets that have fallen out
+    of the window are reused, so the memory used never grows.
+    """
+
+    __slots__ = ("counts", "last")
+
+    def __init__(self, size: int, last: int = 0, counts: Optional[List[int]] = None):
+        self.counts = array("I", counts if counts and len(counts) == size else [0] * size)
+        self.last = last
+
+    def add(self, bucket: int, amount: int = 1):
+        size = len(self.counts)
+        if bucket > self.last:
+            for stale in range(max(self.last + 1, bucket - size + 1), bucket + 1):
+                self.counts[stale % size] = 0
+            self.last = bucket
+        elif bucket <= self.last - size:
+            return
+        self.counts[bucket % size] += amount
+
+    def window(self, bucket: int, length: int) -> List[int]:
+        """Return the counts of the length buckets up to and including bucket, oldest first."""
+        size = len(self.counts)
+        return [
+            self.counts[index % size] if self.last - size < index <= self.last else 0
+            for index in range(bucket - length + 1, bucket + 1)
+        ]
+
+    def merge(self, other: "RingSeries"):
+        size = len(other.counts)
+        for index in range(other.last - size + 1, other.last + 1):
+            amount = other.counts[index % size]
+            if amount:
+                self.add(index, amount)
+
+    def to_list(self) -> list:
+        return [self.last, self.counts.tolist()]
+
+
+class Series:
+    """Hourly and daily usage of a single command or guild."""
+
+    __slots__ = ("hourly", "daily")
+
+    def __init__(self, data: Optional[list] = None):
+        if data:
+            self.hourly = RingSeries(HOURLY_BUCKETS, *data[0])
+            self.daily = RingSeries(DAILY_BUCKETS, *data[1])
+        else:
+            self.hourly = RingSeries(HOURLY_BUCKETS)
+            self.daily = RingSeries(DAILY_BUCKETS)
+
+    def add(self, hour: int, day: int, amount: int = 1):
+        self.hourly.add(hour, amount)
+        self.daily.add(day, amount)
+
+    def total(self, hours: int) -> int:
+        if hours <= HOURLY_BUCKETS:
+            return sum(self.hourly.window(current_hour(), hours))
+        return sum(self.daily.window(current_day(), -(-hours // 24)))
+
+    def merge(self, other: "Series"):
+        self.hourly.merge(other.hourly)
+        self.daily.merge(other.daily)
+
+    def to_list(self) -> list:
+        return [self.hourly.to_list(), self.daily.to_list()]
+
+
+class UsageHistory:
+    """Time bucketed usage per command and per guild."""
+
+    def __init__(self):
+        self.commands: Dict[str, Series] = {}
+        self.guilds: Dict[int, Series] = {}
+        # Guilds whose stored series has been merged into the one in memory.
+        self.loaded_guilds: Set[int] = set()
+        self.dirty_guilds: Set[int] = set()
+        self.dirty = False
+
+    def record(self, name: str, guild: Optional[int]):
+        hour, day = current_hour(), current_day()
+        series = self.commands.get(name)
+        if series is None:
+            series = self.commands[name] = Series()
+        series.add(hour, day)
+        if guild is not None:
+            series = self.guilds.get(guild)
+            if series is None:
+                series = self.guilds[guild] = Series()
+            series.add(hour, day)
+            self.dirty_guilds.add(guild)
+        self.dirty = True
+
+    def top(self, hours: int) -> Counter:
+        """Return the usage of every command over the last hours."""
+        counts = Counter()
+        for name, series in self.commands.items():
+            total = series.total(hours)
+            if total:
+                counts[name] = total
+        return counts
+
+    @staticmethod
+    def trend(series: Optional[Series], days: int) -> List[int]:
+        """Return hourly counts for the last day, or daily counts for more days."""
+        if series is None:
+            return [0] * (24 if days == 1 else days)
+        if days == 1:
+            return series.hourly.window(current_hour(), 24)
+        return series.daily.window(current_day(), days)
@@ -0,0 +1,39 @@
+import math
+from array import array
+
+# Bucket i holds latencies between MIN_LATENCY * GROWTH ** i and MIN_LATENCY * GROWTH ** (i + 1)
+# milliseconds, which keeps every estimate within ~10% of the real value up to ~100 seconds.
+MIN_LATENCY = 0.1
+GROWTH = 2**0.25
+BUCKETS = 80
+
+
+class LatencyHistogram:
+    """Log bucketed latency histogram of a single command, using constant memory."""
+
+    __slots__ = ("buckets", "count", "errors")
+
+    def __init__(self):
+        self.buckets = array("I", [0] * BUCKETS)
+        self.count = 0
+        self.errors = 0
+
+    def add(self, milliseconds: float):
+        if milliseconds <= MIN_LATENCY:
+            index = 0
+        else:
+            index = min(BUCKETS - 1, int(math.log(milliseconds / MIN_LATENCY, GROWTH)))
+        self.buckets[index] += 1
+        self.count += 1
+
+    def percentile(self, pct: float) -> float:
+        """Return the pct-th percentile in ms, estimated as the middle of its bucket."""
+        if not self.count:
+            return 0.0
+        rank = math.ceil(self.count * pct / 100)
+        seen = 0
+        for index, amount in enumerate(self.buckets):
+            seen += amount
+            if seen >= rank:
+                return MIN_LATENCY * GROWTH ** (index + 0.5)
+        return MIN_LATENCY * GROWTH ** (BUCKETS - 0.5)
@@ -0,0 +1,67 @@
+from typing import Dict, Iterator, List, Mapping, Optional, Tuple
+
+
+class Leaderboard:
+    """Command counts kept sorted from most to least used.
+
+    Incrementing a count is O(1): the command is swapped with the first command of its old
+    count, which keeps the order without ever re-sorting. Rendered pages can be stored on the
+    leaderboard and are considered stale once enough counts changed since they were rendered.
+    """
+
+    __slots__ = ("counts", "order", "positions", "first", "total", "changes", "pages")
+
+    def __init__(self, counts: Mapping[str, int] = None):
+        counts = {name: amount for name, amount in (counts or {}).items() if amount > 0}
+        self.counts: Dict[str, int] = counts
+        self.order: List[str] = sorted(counts, key=counts.get, reverse=True)
+        self.positions: Dict[str, int] = {name: index for index, name in enumerate(self.order)}
+        # Index of the first (highest placed) command with each count.
+        self.first: Dict[int, int] = {}
+        for index, name in enumerate(self.order):
+            self.first.setdefault(counts[name], index)
+        self.total = sum(counts.values())
+        self.changes = 0
+        self.pages: Optional[List[str]] = None
+
+    def __len__(self):
+        return len(self.order)
+
+    def __bool__(self):
+        return bool(self.order)
+
+    def get(self, name: str) -> int:
+        return self.counts.get(name, 0)
+
+    def increment(self, name: str):
+        count = self.counts.get(name)
+        if count is None:
+            count = self.counts[name] = 0
+            self.positions[name] = len(self.order)
+            self.order.append(name)
+            self.first.setdefault(0, len(self.order) - 1)
+        index = self.positions[name]
+        head = self.first[count]
+        if head != index:
+            other = self.order[head]
+            self.order[head], self.order[index] = name, other
+            self.positions[name], self.positions[other] = head, index
+        if head + 1 < len(self.order) and self.counts[self.order[head + 1]] == count:
+            self.first[count] = head + 1
+        else:
+            del self.first[count]
+        self.first.setdefault(count + 1, head)
+        self.counts[name] = count + 1
+        self.total += 1
+        self.changes += 1
+
+    def items(self) -> Iterator[Tuple[str, int]]:
+        for name in self.order:
+            yield name, self.counts[name]
+
+    def top(self, limit: int) -> List[Tuple[str, int]]:
+        return [(name, self.counts[name]) for name in self.order[:limit]]
+
+    def stale(self) -> bool:
+        """Whether stored pages are missing or over 1% of the counts changed since."""
+        return self.pages is None or self.changes >= max(1, self.total // 100)
@@ -0,0 +1,69 @@
+import logging
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from aiohttp import web
+
+from .leaderboard import Leaderboard
+
+log = logging.getLogger("red.flare.commandstats")
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+# Scrapes within this many seconds of each other are served the same snapshot.
+SNAPSHOT_TTL = 15
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def collapse(data: Union[Dict[str, int], Leaderboard], limit: int) -> List[Tuple[str, int]]:
+    """Keep the limit largest entries, everything else is summed into "other"."""
+    if isinstance(data, Leaderboard):
+        kept, total = data.top(limit), data.total
+    else:
+        kept = sorted(data.items(), key=lambda t: t[1], reverse=True)[:limit]
+        total = sum(data.values())
+    rest = total - sum(amount for _, amount in kept)
+    if rest:
+        kept.append(("other", rest))
+    return kept
+
+
+def metric(name: str, help_text: str, label: str, samples: Iterable[Tuple[str, int]]) -> str:
+    lines = [f"# TYPE {name} counter", f"# HELP {name} {help_text}"]
+    lines.extend(f'{name}_total{{{label}="{escape(key)}"}} {value}' for key, value in samples)
+    return "\n".join(lines)
+
+
+class MetricsServer:
+    """Serves an OpenMetrics snapshot of the in memory counters over HTTP."""
+
+    def __init__(self, render: Callable[[], str]):
+        self.render = render
+        self.runner: Optional[web.AppRunner] = None
+        self.snapshot = ""
+        self.snapshot_time = 0.0
+
+    async def start(self, host: str, port: int):
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        log.info(f"Serving command stats metrics on {host}:{port}.")
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        now = time.monotonic()
+        if now - self.snapshot_time >= SNAPSHOT_TTL:
+            self.snapshot = self.render()
+            self.snapshot_time = now
+        return web.Response(
+            body=self.snapshot.encode("utf-8"), headers={"Content-Type": CONTENT_TYPE}
+        )
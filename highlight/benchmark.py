@@ -0,0 +1,163 @@
+"""Benchmark the highlight matching hot path without Discord.
+
+Run from the repository root with ``python highlight/benchmark.py`` (or ``make bench``).
+Synthetic channels are generated for every combination of users, words per user and message
+length, then the original per-user loop from ``on_message`` is compared with
+``HighlightMatcher``. Patterns known to backtrack catastrophically are checked to be refused by
+``check_regex`` first.
+"""
+
+import argparse
+import itertools
+import random
+import string
+import sys
+import time
+import tracemalloc
+
+try:
+    from .matcher import HighlightMatcher, check_regex
+except ImportError:
+    from matcher import HighlightMatcher, check_regex
+
+# Each of these takes seconds or more on a few hundred characters.
+UNSAFE_PATTERNS = [
+    r"(a|aa)*c",
+    r"(a+)+b",
+    r"\w*\w*\w*y",
+    r"\w*\w?\w?\w?\w?y",
+    r"\w+\s?\w{0,10}\s?\w{0,10}\s?\w{0,10}\s?\w{0,10}!",
+    r"x{0,10}x{0,10}x{0,10}x{0,10}x{0,10}x{0,10}x{0,10}x{0,10}x{0,10}y",
+]
+
+
+def naive_match(highlight, content, author_id, author_bot):
+    """The matching loop on_message used before the matcher, minus the Discord calls."""
+    hits = {}
+    for user in highlight:
+        if int(user) == author_id:
+            continue
+        highlighted_words = []
+        for word in highlight[user]:
+            if word.lower() in content.lower():
+                if author_bot and not highlight[user][word]["bots"]:
+                    continue
+                if not highlight[user][word]["toggle"]:
+                    continue
+                highlighted_words.append(word)
+        if highlighted_words:
+            hits[int(user)] = highlighted_words
+    return hits
+
+
+def make_channel(rng, vocabulary, users, words):
+    return {
+        str(user): {
+            word: {"toggle": rng.random() < 0.9, "bots": rng.random() < 0.2}
+            for word in rng.sample(vocabulary, words)
+        }
+        for user in range(users)
+    }
+
+
+def make_messages(rng, vocabulary, length, count):
+    messages = []
+    for _ in range(count):
+        parts = []
+        while sum(map(len, parts)) + len(parts) < length:
+            if rng.random() < 0.05:
+                parts.append(rng.choice(vocabulary).upper())
+            else:
+                parts.append("".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 9))))
+        messages.append(" ".join(parts)[:length])
+    return messages
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def measure(func, messages):
+    timings = []
+    for index, content in enumerate(messages):
+        start = time.perf_counter_ns()
+        func(content, index % 50, index % 10 == 0)
+        timings.append((time.perf_counter_ns() - start) / 1000)
+    tracemalloc.start()
+    for index, content in enumerate(messages):
+        func(content, index % 50, index % 10 == 0)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return timings, peak
+
+
+def run(args):
+    rng = random.Random(args.seed)
+    vocabulary = list(
+        {"".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 10))) for _ in range(5000)}
+    )
+    header = (
+        f"{'users':>6} {'words':>6} {'length':>6} {'impl':>8} "
+        f"{'p50 us':>9} {'p95 us':>9} {'p99 us':>9} {'peak KiB':>9} {'build ms':>9}"
+    )
+    failed = False
+    for pattern in UNSAFE_PATTERNS:
+        if check_regex(pattern) is None:
+            print(f"check_regex accepted unsafe pattern {pattern!r}")
+            failed = True
+    print(header)
+    print("-" * len(header))
+    for users, words, length in itertools.product(args.users, args.words, args.lengths):
+        highlight = make_channel(rng, vocabulary, users, words)
+        messages = make_messages(rng, vocabulary, length, args.messages)
+
+        start = time.perf_counter()
+        matcher = HighlightMatcher(highlight)
+        matcher.automaton
+        build = (time.perf_counter() - start) * 1000
+
+        for content in messages:
+            expected = naive_match(highlight, content, 0, False)
+            got = matcher.match(content, author_id=0, author_bot=False)
+            if {k: set(v) for k, v in expected.items()} != {k: set(v) for k, v in got.items()}:
+                print(f"Mismatch for {users} users, {words} words: {content!r}")
+                failed = True
+                break
+
+        implementations = [
+            ("naive", lambda c, a, b: naive_match(highlight, c, a, b), 0.0),
+            ("matcher", lambda c, a, b: matcher.match(c, author_id=a, author_bot=b), build),
+        ]
+        for name, func, build_ms in implementations:
+            timings, peak = measure(func, messages)
+            p99 = percentile(timings, 99)
+            print(
+                f"{users:>6} {words:>6} {length:>6} {name:>8} "
+                f"{percentile(timings, 50):>9.1f} {percentile(timings, 95):>9.1f} {p99:>9.1f} "
+                f"{peak / 1024:>9.1f} {build_ms:>9.2f}"
+            )
+            if name == "matcher" and args.max_p99 and p99 > args.max_p99:
+                print(f"matcher p99 of {p99:.1f}us exceeds the limit of {args.max_p99}us")
+                failed = True
+    return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--words", type=int, nargs="+", default=[1, 5, 20])
+    parser.add_argument("--lengths", type=int, nargs="+", default=[50, 500, 2000])
+    parser.add_argument("--messages", type=int, default=200, help="Messages per scenario.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--max-p99",
+        type=float,
+        default=0,
+        help="Exit non-zero if the matcher's p99 latency in microseconds exceeds this.",
+    )
+    sys.exit(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+from collections import OrderedDict, deque
+from typing import List, NamedTuple, Optional
+
+
+class ContextMessage(NamedTuple):
+    id: int
+    author: str
+    content: str
+
+
+class ContextCache:
+    """Recent messages per channel, used to build highlight context without an API call.
+
+    At most ``channels`` channels are tracked, the least recently active channel is evicted
+    first, and each channel keeps its last ``messages`` messages.
+    """
+
+    def __init__(self, channels: int, messages: int):
+        self.channels = channels
+        self.messages = messages
+        self.buffers: "OrderedDict[int, deque]" = OrderedDict()
+
+    def resize(self, channels: int, messages: int):
+        self.channels = channels
+        if messages != self.messages:
+            self.messages = messages
+            for channel, buffer in self.buffers.items():
+                self.buffers[channel] = deque(buffer, maxlen=messages)
+        while len(self.buffers) > channels:
+            self.buffers.popitem(last=False)
+
+    def add(self, message):
+        if not self.channels:
+            return
+        channel = message.channel.id
+        buffer = self.buffers.get(channel)
+        if buffer is None:
+            buffer = self.buffers[channel] = deque(maxlen=self.messages)
+            if len(self.buffers) > self.channels:
+                self.buffers.popitem(last=False)
+        else:
+            self.buffers.move_to_end(channel)
+        buffer.append(ContextMessage(message.id, str(message.author), message.content))
+
+    def context(self, message, limit: int) -> Optional[List[ContextMessage]]:
+        """Return message and the limit messages sent before it, oldest first.
+
+        Returns None if the buffer doesn't reach back far enough.
+        """
+        buffer = self.buffers.get(message.channel.id)
+        if buffer is None:
+            return None
+        records = list(buffer)
+        for index in range(len(records) - 1, -1, -1):
+            if records[index].id == message.id:
+                break
+        else:
+            return None
+        if index < limit:
+            return None
+        return records[index - limit : index + 1]
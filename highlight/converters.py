@@ -0,0 +1,11 @@
+from redbot.core.commands import BadArgument, Context
+
+MODES = ("substring", "word", "regex")
+
+
+class MatchMode:
+    @classmethod
+    async def convert(cls, ctx: Context, argument: str):
+        if argument.lower() in MODES:
+            return argument.lower()
+        raise BadArgument("Mode not found, please specify either substring, word or regex.")
@@ -0,0 +1,119 @@
+import asyncio
+import heapq
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Set, Tuple
+
+logger = logging.getLogger("red.flare.highlight")
+
+
+class PendingNotification:
+    """Highlight hits for one user in one channel waiting to be sent as a single DM."""
+
+    __slots__ = ("member", "channel", "messages", "words", "due")
+
+    def __init__(self, member, channel, due: float):
+        self.member = member
+        self.channel = channel
+        self.messages = []
+        self.words: Dict[str, None] = {}
+        self.due = due
+
+    def add(self, message, words: List[str], limit: int):
+        self.messages.append(message)
+        if len(self.messages) > limit:
+            del self.messages[0]
+        self.words.update(dict.fromkeys(words))
+
+
+class HighlightDispatcher:
+    """Coalesces highlight hits and sends them from a background task.
+
+    Hits for the same (user, channel) that arrive within ``window`` seconds of each other are
+    merged into one notification, a user is never notified more than once per ``cooldown``
+    seconds and at most ``concurrency`` notifications are sent at the same time.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[PendingNotification], Awaitable[None]],
+        *,
+        window: float,
+        cooldown: float,
+        concurrency: int,
+        batch_limit: int,
+    ):
+        self.send = send
+        self.window = window
+        self.cooldown = cooldown
+        self.batch_limit = batch_limit
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.pending: Dict[Tuple[int, int], PendingNotification] = {}
+        self.queue: List[Tuple[float, Tuple[int, int]]] = []
+        self.last_sent: Dict[int, float] = {}
+        self.sending: Set[asyncio.Task] = set()
+        self.wakeup = asyncio.Event()
+
+    def enqueue(self, member, message, words: List[str]):
+        """Queue a highlight hit. Never blocks."""
+        key = (member.id, message.channel.id)
+        pending = self.pending.get(key)
+        if pending is None:
+            now = time.monotonic()
+            due = max(now + self.window, self.last_sent.get(member.id, 0) + self.cooldown)
+            pending = PendingNotification(member, message.channel, due)
+            self.pending[key] = pending
+            heapq.heappush(self.queue, (due, key))
+            self.wakeup.set()
+        pending.add(message, words, self.batch_limit)
+
+    async def run(self):
+        while True:
+            if not self.queue:
+                self.prune()
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+            due, key = self.queue[0]
+            delay = due - time.monotonic()
+            if delay > 0:
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            heapq.heappop(self.queue)
+            pending = self.pending.pop(key)
+            now = time.monotonic()
+            ready = self.last_sent.get(pending.member.id, 0) + self.cooldown
+            if ready > now:
+                # The user was notified from another channel while this one was coalescing.
+                pending.due = ready
+                self.pending[key] = pending
+                heapq.heappush(self.queue, (ready, key))
+                continue
+            self.last_sent[pending.member.id] = now
+            task = asyncio.create_task(self._send(pending))
+            self.sending.add(task)
+            task.add_done_callback(self.sending.discard)
+
+    async def _send(self, pending: PendingNotification):
+        async with self.semaphore:
+            try:
+                await self.send(pending)
+            except Exception as exc:
+                logger.error("Exception occured while sending a highlight: ", exc_info=exc)
+
+    def prune(self):
+        now = time.monotonic()
+        self.last_sent = {
+            user: sent for user, sent in self.last_sent.items() if now - sent < self.cooldown
+        }
+
+    def close(self):
+        for task in self.sending:
+            task.cancel()
+        self.sending.clear()
+        self.pending.clear()
+        self.queue.clear()
@@ -1,5 +1,8 @@
 import asyncio
+import contextlib
 import logging
+import time
+from collections import OrderedDict
 from typing import Optional
 
 import discord
@@ -8,8 +11,24 @@ from redbot.core import Config, checks, commands
 from redbot.core.utils.chat_formatting import box, humanize_list, inline
 from redbot.core.utils.predicates import MessagePredicate
 
+from .context import ContextCache
+from .dispatcher import HighlightDispatcher, PendingNotification
+from .converters import MatchMode
+from .matcher import HighlightMatcher, check_regex
+
 logger = logging.getLogger("red.flare.highlight")
 
+CACHE_SYNC_INTERVAL = 1800
+# Hits for the same user and channel within this many seconds are sent as one DM.
+NOTIFY_WINDOW = 5
+NOTIFY_COOLDOWN = 15
+NOTIFY_CONCURRENCY = 5
+NOTIFY_BATCH_LIMIT = 5
+# Channels whose read permissions are cached, least recently used ones are dropped first.
+PERMISSION_CACHE_CHANNELS = 1000
+# Seconds a cached read permission is trusted for when no event invalidated it first.
+PERMISSION_TTL = 600
+
 
 class Highlight(commands.Cog):
     """Be notified when keywords are sent."""
@@ -17,12 +36,27 @@ class Highlight(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.config = Config.get_conf(self, identifier=1398467138476, force_registration=True)
-        self.config.register_global(migrated=False)
+        self.config.register_global(migrated=False, context_channels=500, context_messages=10)
         default_channel = {"highlight": {}, "toggle": {}, "bots": {}}
         self.config.register_channel(**default_channel)
+        self.config.register_member(highlight={}, exclusions=[])
         self.highlightcache = {}
+        self.matchers = {}
+        self.guildcache = {}
+        self.guild_matchers = {}
+        self.permission_cache = OrderedDict()
+        self.context_cache = ContextCache(0, 0)
+        self.sync_task: Optional[asyncio.Task] = None
+        self.dispatcher = HighlightDispatcher(
+            self.send_notification,
+            window=NOTIFY_WINDOW,
+            cooldown=NOTIFY_COOLDOWN,
+            concurrency=NOTIFY_CONCURRENCY,
+            batch_limit=NOTIFY_BATCH_LIMIT,
+        )
+        self.dispatch_task: Optional[asyncio.Task] = None
 
-    __version__ = "1.3.1"
+    __version__ = "1.6.0"
 
     def format_help_for_context(self, ctx):
         """Thanks Sinbad."""
@@ -32,9 +66,163 @@ class Highlight(commands.Cog):
     async def initalize(self):
         await self.migrate_config()
         await self.generate_cache()
+        self.context_cache.resize(
+            await self.config.context_channels(), await self.config.context_messages()
+        )
+        self.sync_task = self.bot.loop.create_task(self.cache_sync_loop())
+        self.dispatch_task = self.bot.loop.create_task(self.dispatcher.run())
+
+    def cog_unload(self):
+        if self.sync_task:
+            self.sync_task.cancel()
+        if self.dispatch_task:
+            self.dispatch_task.cancel()
+        self.dispatcher.close()
 
     async def generate_cache(self):
         self.highlightcache = await self.config.all_channels()
+        self.guildcache = await self.config.all_members()
+        self.matchers = {}
+        self.guild_matchers = {}
+
+    def update_cache(self, channel: discord.TextChannel, user: discord.abc.User, highlights: dict):
+        """Patch the cached highlights of a single user in a single channel."""
+        highlights = {word: dict(settings) for word, settings in highlights.items()}
+        data = self.highlightcache.setdefault(channel.id, {"highlight": {}})
+        data.setdefault("highlight", {})[str(user.id)] = highlights
+        matcher = self.matchers.get(channel.id)
+        if matcher is not None:
+            matcher.update_user(user.id, highlights)
+
+    def update_guild_cache(self, member: discord.Member, **data):
+        """Patch the cached guild highlights and exclusions of a single member."""
+        members = self.guildcache.setdefault(member.guild.id, {})
+        cached = members.setdefault(member.id, {"highlight": {}, "exclusions": []})
+        if "exclusions" in data:
+            cached["exclusions"] = list(data["exclusions"])
+        if "highlight" in data:
+            highlights = {word: dict(settings) for word, settings in data["highlight"].items()}
+            cached["highlight"] = highlights
+            matcher = self.guild_matchers.get(member.guild.id)
+            if matcher is not None:
+                matcher.update_user(member.id, highlights)
+
+    async def verify_cache(self):
+        """Compare the highlight cache against Config and rebuild anything that drifted."""
+        data = await self.config.all_channels()
+        drifted = [
+            channel
+            for channel in data.keys() | self.highlightcache.keys()
+            if data.get(channel, {}).get("highlight", {})
+            != self.highlightcache.get(channel, {}).get("highlight", {})
+        ]
+        self.highlightcache = data
+        for channel in drifted:
+            self.matchers.pop(channel, None)
+        if drifted:
+            logger.warning(f"Highlight cache drifted from config in {len(drifted)} channel(s).")
+        data = await self.config.all_members()
+        drifted = [
+            guild
+            for guild in data.keys() | self.guildcache.keys()
+            if data.get(guild, {}) != self.guildcache.get(guild, {})
+        ]
+        self.guildcache = data
+        for guild in drifted:
+            self.guild_matchers.pop(guild, None)
+        if drifted:
+            logger.warning(f"Highlight cache drifted from config in {len(drifted)} guild(s).")
+
+    async def cache_sync_loop(self):
+        await self.bot.wait_until_ready()
+        while True:
+            await asyncio.sleep(CACHE_SYNC_INTERVAL)
+            try:
+                await self.verify_cache()
+            except Exception as exc:
+                logger.error(
+                    "Exception occured while verifying the highlight cache: ", exc_info=exc
+                )
+
+    def get_matcher(self, channel_id: int) -> Optional[HighlightMatcher]:
+        """Return the keyword matcher for a channel, building it on first use."""
+        matcher = self.matchers.get(channel_id)
+        if matcher is None:
+            data = self.highlightcache.get(channel_id)
+            if data is None:
+                return None
+            matcher = HighlightMatcher(data.get("highlight", {}))
+            self.matchers[channel_id] = matcher
+        return matcher
+
+    def get_guild_matcher(self, guild_id: int) -> Optional[HighlightMatcher]:
+        """Return the keyword matcher for guild wide highlights, building it on first use."""
+        matcher = self.guild_matchers.get(guild_id)
+        if matcher is None:
+            members = self.guildcache.get(guild_id)
+            if members is None:
+                return None
+            matcher = HighlightMatcher(
+                {member: data["highlight"] for member, data in members.items()}
+            )
+            self.guild_matchers[guild_id] = matcher
+        return matcher
+
+    def can_read(self, member: discord.Member, channel: discord.TextChannel) -> bool:
+        """Cached read_messages check, see the listeners below for when it is invalidated."""
+        now = time.monotonic()
+        cache = self.permission_cache.get(channel.id)
+        if cache is None:
+            cache = self.permission_cache[channel.id] = {}
+            if len(self.permission_cache) > PERMISSION_CACHE_CHANNELS:
+                self.permission_cache.popitem(last=False)
+        else:
+            self.permission_cache.move_to_end(channel.id)
+        entry = cache.get(member.id)
+        if entry is None or entry[1] <= now:
+            entry = cache[member.id] = (
+                channel.permissions_for(member).read_messages,
+                now + PERMISSION_TTL,
+            )
+        return entry[0]
+
+    def invalidate_permissions(self, guild: discord.Guild, member: Optional[int] = None):
+        for channel in guild.text_channels:
+            if member is None:
+                self.permission_cache.pop(channel.id, None)
+            elif channel.id in self.permission_cache:
+                self.permission_cache[channel.id].pop(member, None)
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before, after):
+        if before.roles != after.roles:
+            self.invalidate_permissions(after.guild, after.id)
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member):
+        self.invalidate_permissions(member.guild, member.id)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member):
+        self.invalidate_permissions(member.guild, member.id)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_update(self, before, after):
+        if before.overwrites != after.overwrites:
+            self.permission_cache.pop(after.id, None)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel):
+        self.permission_cache.pop(channel.id, None)
+
+    @commands.Cog.listener()
+    async def on_guild_role_update(self, before, after):
+        if before.permissions != after.permissions:
+            self.invalidate_permissions(after.guild)
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role):
+        self.invalidate_permissions(role.guild)
 
     async def migrate_config(self):
         if not await self.config.migrated():
@@ -60,50 +248,68 @@ class Highlight(commands.Cog):
     async def on_message(self, message):
         if isinstance(message.channel, discord.abc.PrivateChannel):
             return
-        highlight = self.highlightcache.get(message.channel.id)
-        if highlight is None:
+        matcher = self.get_matcher(message.channel.id)
+        guild_matcher = self.get_guild_matcher(message.guild.id)
+        if not matcher and not guild_matcher:
             return
-        highlight = highlight.get("highlight", [])
-        for user in highlight:
-            if int(user) == message.author.id:
+        self.context_cache.add(message)
+        hits = {}
+        if matcher:
+            hits = matcher.match(
+                message.content, author_id=message.author.id, author_bot=message.author.bot
+            )
+        if guild_matcher:
+            members = self.guildcache[message.guild.id]
+            guild_hits = guild_matcher.match(
+                message.content, author_id=message.author.id, author_bot=message.author.bot
+            )
+            for user, words in guild_hits.items():
+                if message.channel.id in members[user]["exclusions"]:
+                    continue
+                hits.setdefault(user, []).extend(words)
+        for user, highlighted_words in hits.items():
+            highlighted_usr = message.guild.get_member(user)
+            if highlighted_usr is None:
                 continue
-            highlighted_words = []
-            for word in highlight[user]:
-                if word.lower() in message.content.lower():
-                    highlighted_usr = message.guild.get_member(int(user))
-                    if highlighted_usr is None:
-                        continue
-                    if not message.channel.permissions_for(highlighted_usr).read_messages:
-                        continue
-                    if message.author.bot:
-                        if not highlight[user][word]["bots"]:
-                            continue
-
-                    if not highlight[user][word]["toggle"]:
-                        continue
-                    highlighted_words.append(word)
-            if highlighted_words:
-                msglist = []
-                msglist.append(message)
-                async for messages in message.channel.history(
-                    limit=5, before=message, oldest_first=False
-                ):
-                    msglist.append(messages)
-                msglist.reverse()
-                context = "\n".join([f"**{x.author}**: {x.content}" for x in msglist])
-                if len(context) > 2000:
-                    context = "**Context omitted due to message size limits.\n**"
-                embed = discord.Embed(
-                    title="Context:",
-                    colour=0xFF0000,
-                    timestamp=message.created_at,
-                    description="{}".format(context),
-                )
-                embed.add_field(name="Jump", value=f"[Click for context]({message.jump_url})")
-                await highlighted_usr.send(
-                    f"Your highlighted word{'s' if len(highlighted_words) > 1 else ''} {humanize_list(list(map(inline, highlighted_words)))} was mentioned in {message.channel.mention} in {message.guild.name} by {message.author.display_name}.\n",
-                    embed=embed,
-                )
+            if not self.can_read(highlighted_usr, message.channel):
+                continue
+            self.dispatcher.enqueue(highlighted_usr, message, highlighted_words)
+
+    async def send_notification(self, pending: PendingNotification):
+        message = pending.messages[-1]
+        msglist = self.context_cache.context(message, 5)
+        if msglist is None:
+            msglist = []
+            msglist.append(message)
+            async for messages in message.channel.history(
+                limit=5, before=message, oldest_first=False
+            ):
+                msglist.append(messages)
+            msglist.reverse()
+        context = "\n".join([f"**{x.author}**: {x.content}" for x in msglist])
+        if len(context) > 2000:
+            context = "**Context omitted due to message size limits.\n**"
+        embed = discord.Embed(
+            title="Context:",
+            colour=0xFF0000,
+            timestamp=message.created_at,
+            description="{}".format(context),
+        )
+        if len(pending.messages) == 1:
+            embed.add_field(name="Jump", value=f"[Click for context]({message.jump_url})")
+        else:
+            jumps = [
+                f"[{x.author.display_name} at {x.created_at:%H:%M:%S} UTC]({x.jump_url})"
+                for x in pending.messages
+            ]
+            embed.add_field(name="Jump", value="\n".join(jumps))
+        words = list(pending.words)
+        authors = list(dict.fromkeys(x.author.display_name for x in pending.messages))
+        with contextlib.suppress(discord.Forbidden):
+            await pending.member.send(
+                f"Your highlighted word{'s' if len(words) > 1 else ''} {humanize_list(list(map(inline, words)))} was mentioned in {message.channel.mention} in {message.guild.name} by {humanize_list(authors)}.\n",
+                embed=embed,
+            )
 
     def channel_check(self, ctx, channel):
         return (
@@ -120,8 +326,8 @@ class Highlight(commands.Cog):
     async def add(self, ctx, channel: Optional[discord.TextChannel] = None, *, text: str):
         """Add a word to be highlighted on.
 
-        Text will be converted to lowercase.\nCan also provide an optional channel arguement for
-        the highlight to be applied to that channel.
+        Matching ignores case unless turned on with `[p]highlight case`.\nCan also provide an
+        optional channel arguement for the highlight to be applied to that channel.
         """
         channel = channel or ctx.channel
         check = self.channel_check(ctx, channel)
@@ -131,14 +337,19 @@ class Highlight(commands.Cog):
         async with self.config.channel(channel).highlight() as highlight:
             if str(ctx.author.id) not in highlight:
                 highlight[f"{ctx.author.id}"] = {}
-            if text.lower() not in highlight[f"{ctx.author.id}"]:
-                highlight[f"{ctx.author.id}"][text.lower()] = {"toggle": False, "bots": False}
+            if find_word(highlight[f"{ctx.author.id}"], text) is None:
+                highlight[f"{ctx.author.id}"][text] = {
+                    "toggle": False,
+                    "bots": False,
+                    "mode": "substring",
+                    "case": False,
+                }
                 await ctx.send(
                     f"The word `{text}` has been added to your highlight list for {channel}."
                 )
             else:
                 await ctx.send(f"The word {text} is already in your highlight list for {channel}.")
-        await self.generate_cache()
+        self.update_cache(channel, ctx.author, highlight.get(str(ctx.author.id), {}))
 
     @highlight.command()
     async def remove(self, ctx, channel: Optional[discord.TextChannel] = None, *, word: str):
@@ -146,7 +357,6 @@ class Highlight(commands.Cog):
 
         An optional channel can be provided to remove a highlight from that channel.
         """
-        word = word.lower()
         channel = channel or ctx.channel
         check = self.channel_check(ctx, channel)
         if not check:
@@ -156,7 +366,8 @@ class Highlight(commands.Cog):
             highlights = highlight.get(str(ctx.author.id))
             if not highlights:
                 return await ctx.send(f"You don't have any highlights setup in {channel}")
-            if word in highlight[f"{ctx.author.id}"]:
+            word = find_word(highlights, word) or word
+            if word in highlights:
                 await ctx.send(
                     f"Highlighted word `{word}` has been removed from {channel} successfully."
                 )
@@ -164,7 +375,7 @@ class Highlight(commands.Cog):
 
             else:
                 await ctx.send("Your word is not currently setup in that channel..")
-        await self.generate_cache()
+        self.update_cache(channel, ctx.author, highlight.get(str(ctx.author.id), {}))
 
     @highlight.command()
     async def toggle(
@@ -187,25 +398,26 @@ class Highlight(commands.Cog):
                     return await ctx.send("You do not have any highlights setup.")
                 for word in highlights:
                     highlight[str(ctx.author.id)][word]["toggle"] = state
+            self.update_cache(channel, ctx.author, highlight.get(str(ctx.author.id), {}))
             if state:
                 await ctx.send("All your highlights have been enabled.")
                 return
             await ctx.send("All your highlights have been disabled.")
             return
-        word = word.lower()
         async with self.config.channel(channel).highlight() as highlight:
             highlights = highlight.get(str(ctx.author.id))
             if not highlights:
                 return await ctx.send("You do not have any highlights setup.")
-            if word not in highlight[str(ctx.author.id)]:
+            if find_word(highlights, word) is None:
                 return await ctx.send(
                     f"You do not have a highlight for `{word}` setup in {channel}"
                 )
+            word = find_word(highlights, word)
             highlight[str(ctx.author.id)][word]["toggle"] = state
-            if state:
-                return await ctx.send(f"The highlight `{word}` has been enabled in {channel}.")
-            await ctx.send(f"The highlight `{word}` has been disabled in {channel}.")
-        await self.generate_cache()
+        self.update_cache(channel, ctx.author, highlight.get(str(ctx.author.id), {}))
+        if state:
+            return await ctx.send(f"The highlight `{word}` has been enabled in {channel}.")
+        await ctx.send(f"The highlight `{word}` has been disabled in {channel}.")
 
     @highlight.command()
     async def bots(
@@ -240,6 +452,7 @@ class Highlight(commands.Cog):
                         return await ctx.send("You do not have any highlights setup.")
                     for word in highlights:
                         highlight[str(ctx.author.id)][word]["bots"] = state
+                self.update_cache(channel, ctx.author, highlight.get(str(ctx.author.id), {}))
                 if state:
                     await ctx.send("Bots will now trigger all of your highlights.")
                     return
@@ -249,24 +462,243 @@ class Highlight(commands.Cog):
             else:
                 await ctx.send("Cancelling.")
                 return
-        word = word.lower()
         async with self.config.channel(channel).highlight() as highlight:
             highlights = highlight.get(str(ctx.author.id))
             if not highlights:
                 return await ctx.send("You do not have any highlights setup.")
-            if word not in highlight[str(ctx.author.id)]:
+            if find_word(highlights, word) is None:
                 return await ctx.send(
                     f"You do not have a highlight for `{word}` setup in {channel}"
                 )
+            word = find_word(highlights, word)
             highlight[str(ctx.author.id)][word]["bots"] = state
-            if state:
+        self.update_cache(channel, ctx.author, highlight.get(str(ctx.author.id), {}))
+        if state:
+            return await ctx.send(
+                f"The highlight `{word}` will now be triggered by bots in {channel}."
+            )
+        await ctx.send(f"The highlight `{word}` will no longer be trigged by bots in {channel}.")
+
+    @highlight.command()
+    async def mode(
+        self, ctx, mode: MatchMode, channel: Optional[discord.TextChannel] = None, *, word: str
+    ):
+        """Change how a highlight is matched.
+
+        Valid modes are `substring` (default), `word` to only match whole words and `regex` to
+        treat the highlight as a regular expression.
+        """
+        channel = channel or ctx.channel
+        check = self.channel_check(ctx, channel)
+        if not check:
+            await ctx.send("Either you or the bot does not have permission for that channel.")
+            return
+        async with self.config.channel(channel).highlight() as highlight:
+            highlights = highlight.get(str(ctx.author.id))
+            if not highlights:
+                return await ctx.send("You do not have any highlights setup.")
+            if find_word(highlights, word) is None:
                 return await ctx.send(
-                    f"The highlight `{word}` will now be triggered by bots in {channel}."
+                    f"You do not have a highlight for `{word}` setup in {channel}"
                 )
-            await ctx.send(
-                f"The highlight `{word}` will no longer be trigged by bots in {channel}."
-            )
-        await self.generate_cache()
+            word = find_word(highlights, word)
+            if mode == "regex":
+                error = check_regex(word)
+                if error is not None:
+                    return await ctx.send(error)
+            highlight[str(ctx.author.id)][word]["mode"] = mode
+        self.update_cache(channel, ctx.author, highlight.get(str(ctx.author.id), {}))
+        await ctx.send(f"The highlight `{word}` will now be matched as a {mode} in {channel}.")
+
+    @highlight.command()
+    async def case(
+        self, ctx, state: bool, channel: Optional[discord.TextChannel] = None, *, word: str
+    ):
+        """Toggle case sensitive matching of a highlight.
+
+        The highlight is matched exactly as it was added when enabled.
+        """
+        channel = channel or ctx.channel
+        check = self.channel_check(ctx, channel)
+        if not check:
+            await ctx.send("Either you or the bot does not have permission for that channel.")
+            return
+        async with self.config.channel(channel).highlight() as highlight:
+            highlights = highlight.get(str(ctx.author.id))
+            if not highlights:
+                return await ctx.send("You do not have any highlights setup.")
+            if find_word(highlights, word) is None:
+                return await ctx.send(
+                    f"You do not have a highlight for `{word}` setup in {channel}"
+                )
+            word = find_word(highlights, word)
+            highlight[str(ctx.author.id)][word]["case"] = state
+        self.update_cache(channel, ctx.author, highlight.get(str(ctx.author.id), {}))
+        if state:
+            return await ctx.send(f"The highlight `{word}` is now case sensitive in {channel}.")
+        await ctx.send(f"The highlight `{word}` is no longer case sensitive in {channel}.")
+
+    @checks.is_owner()
+    @highlight.command()
+    async def contextcache(self, ctx, channels: int, messages: int):
+        """Set how many recent messages are kept for highlight context.
+
+        Keeps the last `messages` messages in up to `channels` channels, the least active
+        channels are dropped first. Context falls back to fetching message history when a
+        channel isn't cached. Setting channels to 0 disables the cache.
+        """
+        if channels < 0:
+            return await ctx.send("You must provide a channel amount of 0 or greater.")
+        if not 6 <= messages <= 100:
+            return await ctx.send("You must keep between 6 and 100 messages per channel.")
+        await self.config.context_channels.set(channels)
+        await self.config.context_messages.set(messages)
+        self.context_cache.resize(channels, messages)
+        await ctx.send(
+            f"Highlight context will be kept for the last {messages} messages in up to {channels} channels."
+        )
+
+    @highlight.group(name="guild", autohelp=True)
+    async def _guild(self, ctx):
+        """Highlights that apply to every channel in this server.
+
+        Guild highlights are stored once and apply to every channel you can read, unless the
+        channel has been excluded.
+        """
+
+    @_guild.command(name="add")
+    async def guild_add(self, ctx, *, text: str):
+        """Add a word to be highlighted on in every channel."""
+        async with self.config.member(ctx.author).highlight() as highlight:
+            if find_word(highlight, text) is not None:
+                return await ctx.send(f"The word {text} is already in your guild highlight list.")
+            highlight[text] = {"toggle": True, "bots": False, "mode": "substring", "case": False}
+        self.update_guild_cache(ctx.author, highlight=highlight)
+        await ctx.send(f"The word `{text}` has been added to your guild highlight list.")
+
+    @_guild.command(name="remove")
+    async def guild_remove(self, ctx, *, word: str):
+        """Remove a guild highlight."""
+        async with self.config.member(ctx.author).highlight() as highlight:
+            key = find_word(highlight, word)
+            if key is None:
+                return await ctx.send("Your word is not currently setup as a guild highlight.")
+            del highlight[key]
+        self.update_guild_cache(ctx.author, highlight=highlight)
+        await ctx.send(f"Highlighted word `{key}` has been removed from your guild highlights.")
+
+    async def edit_guild_highlight(self, ctx, word: Optional[str], setting: str, value):
+        """Change a setting of one (or, without a word, all) of the author's guild highlights.
+
+        Returns whether anything was changed.
+        """
+        async with self.config.member(ctx.author).highlight() as highlight:
+            if word is None:
+                keys = list(highlight)
+            else:
+                keys = [key for key in [find_word(highlight, word)] if key is not None]
+            for key in keys:
+                highlight[key][setting] = value
+        if not keys:
+            return False
+        self.update_guild_cache(ctx.author, highlight=highlight)
+        return True
+
+    @_guild.command(name="toggle")
+    async def guild_toggle(self, ctx, state: bool, *, word: str = None):
+        """Toggle guild highlighting.
+
+        Not passing a word will enable/disable all of your guild highlights.
+        """
+        if not await self.edit_guild_highlight(ctx, word, "toggle", state):
+            return await ctx.send("You do not have that guild highlight setup.")
+        await ctx.send(f"Guild highlighting has been {'enabled' if state else 'disabled'}.")
+
+    @_guild.command(name="bots")
+    async def guild_bots(self, ctx, state: bool, *, word: str = None):
+        """Enable highlighting of bot messages for guild highlights.
+
+        Not passing a word will change all of your guild highlights.
+        """
+        if not await self.edit_guild_highlight(ctx, word, "bots", state):
+            return await ctx.send("You do not have that guild highlight setup.")
+        if state:
+            return await ctx.send("Bots will now trigger your guild highlights.")
+        await ctx.send("Bots will no longer trigger your guild highlights.")
+
+    @_guild.command(name="mode")
+    async def guild_mode(self, ctx, mode: MatchMode, *, word: str):
+        """Change how a guild highlight is matched.
+
+        Valid modes are `substring` (default), `word` and `regex`.
+        """
+        if mode == "regex":
+            error = check_regex(word)
+            if error is not None:
+                return await ctx.send(error)
+        if not await self.edit_guild_highlight(ctx, word, "mode", mode):
+            return await ctx.send("You do not have that guild highlight setup.")
+        await ctx.send(f"The guild highlight `{word}` will now be matched as a {mode}.")
+
+    @_guild.command(name="case")
+    async def guild_case(self, ctx, state: bool, *, word: str):
+        """Toggle case sensitive matching of a guild highlight."""
+        if not await self.edit_guild_highlight(ctx, word, "case", state):
+            return await ctx.send("You do not have that guild highlight setup.")
+        await ctx.send(
+            f"The guild highlight `{word}` is {'now' if state else 'no longer'} case sensitive."
+        )
+
+    @_guild.command(name="exclude")
+    async def guild_exclude(self, ctx, state: bool, channel: discord.TextChannel = None):
+        """Exclude a channel from your guild highlights.
+
+        Pass false to stop excluding the channel again.
+        """
+        channel = channel or ctx.channel
+        async with self.config.member(ctx.author).exclusions() as exclusions:
+            if state and channel.id not in exclusions:
+                exclusions.append(channel.id)
+            elif not state and channel.id in exclusions:
+                exclusions.remove(channel.id)
+        self.update_guild_cache(ctx.author, exclusions=exclusions)
+        if state:
+            return await ctx.send(f"Your guild highlights will no longer trigger in {channel}.")
+        await ctx.send(f"Your guild highlights will trigger in {channel} again.")
+
+    @_guild.command(name="list")
+    async def guild_list(self, ctx):
+        """Current guild highlight settings."""
+        data = await self.config.member(ctx.author).all()
+        highlight = data["highlight"]
+        if not highlight:
+            return await ctx.send("You currently do not have any guild highlights set up.")
+        words = [
+            [
+                word,
+                on_or_off(settings["toggle"]),
+                yes_or_no(not settings["bots"]),
+                settings.get("mode", "substring"),
+                yes_or_no(settings.get("case", False)),
+            ]
+            for word, settings in highlight.items()
+        ]
+        embed = discord.Embed(
+            title=f"Current guild highlights for {ctx.author.display_name}:",
+            colour=ctx.author.colour,
+            description=box(
+                tabulate.tabulate(
+                    sorted(words, key=lambda x: x[1], reverse=True),
+                    headers=["Word", "Toggle", "Ignoring Bots", "Mode", "Case Sensitive"],
+                ),
+                lang="prolog",
+            ),
+        )
+        excluded = [ctx.guild.get_channel(x) for x in data["exclusions"]]
+        excluded = [x.mention for x in excluded if x is not None]
+        if excluded:
+            embed.add_field(name="Excluded channels", value=humanize_list(excluded)[:1024])
+        await ctx.send(embed=embed)
 
     @highlight.command(name="list")
     async def _list(self, ctx, channel: Optional[discord.TextChannel] = None):
@@ -286,6 +718,8 @@ class Highlight(commands.Cog):
                     word,
                     on_or_off(highlight[f"{ctx.author.id}"][word]["toggle"]),
                     yes_or_no(not highlight[f"{ctx.author.id}"][word]["bots"]),
+                    highlight[f"{ctx.author.id}"][word].get("mode", "substring"),
+                    yes_or_no(highlight[f"{ctx.author.id}"][word].get("case", False)),
                 ]
                 for word in highlight[f"{ctx.author.id}"]
             ]
@@ -295,7 +729,7 @@ class Highlight(commands.Cog):
                 description=box(
                     tabulate.tabulate(
                         sorted(words, key=lambda x: x[1], reverse=True),
-                        headers=["Word", "Toggle", "Ignoring Bots"],
+                        headers=["Word", "Toggle", "Ignoring Bots", "Mode", "Case Sensitive"],
                     ),
                     lang="prolog",
                 ),
@@ -306,6 +740,17 @@ class Highlight(commands.Cog):
             await ctx.send(f"You currently do not have any highlighted words set up in {channel}.")
 
 
+def find_word(highlights: dict, word: str) -> Optional[str]:
+    """Find the key a word was stored under, ignoring case."""
+    if word in highlights:
+        return word
+    word = word.lower()
+    for key in highlights:
+        if key.lower() == word:
+            return key
+    return None
+
+
 def yes_or_no(boolean):
     if boolean:
         return "Yes"
@@ -0,0 +1,306 @@
+"""Keyword matching for highlight.
+
+Nothing in here may import discord or redbot, the matchers are plain data structures built
+from the cog's highlight cache.
+"""
+
+import logging
+import re
+import time
+from collections import deque
+from typing import Dict, Iterable, List, NamedTuple, Optional, Pattern, Set, Tuple
+
+try:
+    import re._parser as sre_parse
+except ImportError:
+    import sre_parse
+
+logger = logging.getLogger("red.flare.highlight")
+
+# Below this many keywords a str.find per keyword beats walking the automaton in Python.
+LINEAR_SCAN_LIMIT = 64
+MAX_REGEX_LENGTH = 100
+MAX_REGEX_CONTENT = 4000
+# Most backtracking steps check_regex lets a pattern take on MAX_REGEX_CONTENT characters, which
+# allows one unbounded repeat plus an optional character or two alternatives, under half a second.
+MAX_REGEX_STEPS = 4 * MAX_REGEX_CONTENT**2
+# Seconds all regex highlights of a channel should spend on a single message. A search can't be
+# stopped once started, so this only skips the remaining patterns after an overrun and counts
+# strikes against slow ones, MAX_REGEX_STEPS is what bounds a single search.
+REGEX_BUDGET = 0.005
+# Patterns that overran the budget on this many messages are no longer run.
+MAX_REGEX_STRIKES = 3
+
+
+class Entry(NamedTuple):
+    user: int
+    word: str
+    toggle: bool
+    bots: bool
+    verify: Optional[Pattern]
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton over a fixed set of keywords.
+
+    Finds every keyword contained in a piece of text in a single pass over it.
+    """
+
+    __slots__ = ("keywords", "_goto", "_fail", "_out")
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords = list(dict.fromkeys(keyword for keyword in keywords if keyword))
+        goto = [{}]
+        out = [()]
+        for index, keyword in enumerate(self.keywords):
+            node = 0
+            for char in keyword:
+                child = goto[node].get(char)
+                if child is None:
+                    child = len(goto)
+                    goto[node][char] = child
+                    goto.append({})
+                    out.append(())
+                node = child
+            out[node] += (index,)
+
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in goto[node].items():
+                queue.append(child)
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                fail[child] = goto[state].get(char, 0)
+                out[child] += out[fail[child]]
+        self._goto = goto
+        self._fail = fail
+        self._out = out
+
+    def __len__(self):
+        return len(self.keywords)
+
+    def search(self, text: str) -> Set[str]:
+        """Return the set of keywords found in text."""
+        if len(self.keywords) <= LINEAR_SCAN_LIMIT:
+            return {keyword for keyword in self.keywords if keyword in text}
+        goto, fail, out = self._goto, self._fail, self._out
+        found = set()
+        node = 0
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if out[node]:
+                found.update(out[node])
+        return {self.keywords[index] for index in found}
+
+
+def check_regex(pattern: str) -> Optional[str]:
+    """Return why pattern is unsafe to run on every message, or None if it is fine.
+
+    ``re`` can't be interrupted once a search starts, so patterns are refused up front unless
+    their worst case is bounded: backreferences, nested repeats and alternations inside a
+    repeat are not allowed, and the ways the remaining repeats and alternations can split a
+    message, multiplied together, must stay under ``MAX_REGEX_STEPS``.
+    """
+    if len(pattern) > MAX_REGEX_LENGTH:
+        return f"Patterns may be at most {MAX_REGEX_LENGTH} characters long."
+    try:
+        parsed = sre_parse.parse(pattern)
+    except re.error as exc:
+        return f"That isn't a valid pattern: {exc}"
+    choices = [1]
+    error = _check_tree(parsed, 0, choices)
+    if error is None and MAX_REGEX_CONTENT * choices[0] > MAX_REGEX_STEPS:
+        return "That pattern has too many repeats or alternatives to run on every message."
+    return error
+
+
+_REPEATS = tuple(
+    getattr(sre_parse, name)
+    for name in ("MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT")
+    if hasattr(sre_parse, name)
+)
+_ATOMIC_GROUP = getattr(sre_parse, "ATOMIC_GROUP", None)
+
+
+def _check_tree(tree, depth: int, choices: List[int]) -> Optional[str]:
+    """Check tree, multiplying choices[0] by how many ways each repeat or alternation can go.
+
+    A repeat can stop after any count between its bounds, an unbounded one after any character
+    of the message. Alternatives are multiplied together rather than added, which overestimates
+    but keeps the bound safe without tracking each branch on its own.
+    """
+    for op, value in tree:
+        if op is sre_parse.GROUPREF or op is sre_parse.GROUPREF_EXISTS:
+            return "Backreferences are not allowed."
+        if op in _REPEATS:
+            minimum, maximum, subtree = value
+            if maximum > 1 and depth:
+                return "Nested repeats are not allowed."
+            choices[0] *= min(maximum - minimum, MAX_REGEX_CONTENT) + 1
+            error = _check_tree(subtree, depth + (maximum > 1), choices)
+        elif op is sre_parse.SUBPATTERN:
+            error = _check_tree(value[-1], depth, choices)
+        elif op is _ATOMIC_GROUP:
+            error = _check_tree(value, depth, choices)
+        elif op is sre_parse.BRANCH:
+            if depth:
+                return "Alternations inside a repeat are not allowed, use a character class."
+            choices[0] *= len(value[1])
+            error = None
+            for branch in value[1]:
+                error = error or _check_tree(branch, depth, choices)
+        elif op is sre_parse.ASSERT or op is sre_parse.ASSERT_NOT:
+            error = _check_tree(value[1], depth, choices)
+        else:
+            continue
+        if error:
+            return error
+    return None
+
+
+class HighlightMatcher:
+    """Matcher for a single channel's highlights.
+
+    Built from the ``highlight`` section of a channel in the highlight cache, keyword hits are
+    mapped back to the users and words that registered them. A user's entries can be replaced
+    in place, the automaton is only rebuilt (lazily) when the set of keywords changes.
+
+    Substring and whole word highlights go through the automaton, which is run over the
+    lowercased message, whole word and case sensitive hits are then confirmed against the
+    original message. Regex highlights are compiled once per distinct pattern and share a
+    time budget per message.
+    """
+
+    __slots__ = ("entries", "regexes", "users", "_automaton")
+
+    def __init__(self, highlights: Dict[str, Dict[str, dict]]):
+        self.entries: Dict[str, Dict[int, Entry]] = {}
+        self.regexes: Dict[Tuple[str, bool], RegexGroup] = {}
+        self.users: Dict[int, List[tuple]] = {}
+        self._automaton: Optional[KeywordAutomaton] = None
+        for user, words in highlights.items():
+            self._add_user(int(user), words)
+
+    def __bool__(self):
+        return bool(self.entries or self.regexes)
+
+    @property
+    def automaton(self) -> KeywordAutomaton:
+        if self._automaton is None:
+            self._automaton = KeywordAutomaton(self.entries)
+        return self._automaton
+
+    def _add_user(self, user: int, words: Dict[str, dict]):
+        keys = []
+        for word, settings in words.items():
+            mode = settings.get("mode", "substring")
+            case = settings.get("case", False)
+            if mode == "regex":
+                key = (word, case)
+                group = self.regexes.get(key)
+                if group is None:
+                    try:
+                        pattern = re.compile(word, 0 if case else re.IGNORECASE)
+                    except re.error:
+                        continue
+                    group = self.regexes[key] = RegexGroup(pattern)
+                group.owners[user] = Entry(user, word, settings["toggle"], settings["bots"], None)
+                keys.append(("regex", key))
+                continue
+            if mode == "word":
+                verify = re.compile(
+                    rf"(?<!\w){re.escape(word)}(?!\w)", 0 if case else re.IGNORECASE
+                )
+            elif case:
+                verify = re.compile(re.escape(word))
+            else:
+                verify = None
+            keyword = word.lower()
+            if keyword not in self.entries:
+                self.entries[keyword] = {}
+                self._automaton = None
+            self.entries[keyword][user] = Entry(
+                user, word, settings["toggle"], settings["bots"], verify
+            )
+            keys.append(("keyword", keyword))
+        if keys:
+            self.users[user] = list(dict.fromkeys(keys))
+
+    def _remove_user(self, user: int):
+        for kind, key in self.users.pop(user, ()):
+            if kind == "regex":
+                owners = self.regexes[key].owners
+                owners.pop(user, None)
+                if not owners:
+                    del self.regexes[key]
+                continue
+            owners = self.entries[key]
+            owners.pop(user, None)
+            if not owners:
+                del self.entries[key]
+                self._automaton = None
+
+    def update_user(self, user: int, words: Dict[str, dict]):
+        """Replace every entry belonging to user with words."""
+        self._remove_user(user)
+        self._add_user(user, words)
+
+    def match(self, content: str, *, author_id: int, author_bot: bool) -> Dict[int, List[str]]:
+        """Return the highlighted words found in content, keyed by user id."""
+        hits: Dict[int, List[str]] = {}
+        if self.entries:
+            for keyword in self.automaton.search(content.lower()):
+                for entry in self.entries[keyword].values():
+                    if not _accepts(entry, author_id, author_bot):
+                        continue
+                    if entry.verify is not None and entry.verify.search(content) is None:
+                        continue
+                    hits.setdefault(entry.user, []).append(entry.word)
+        if self.regexes:
+            self._match_regexes(content[:MAX_REGEX_CONTENT], author_id, author_bot, hits)
+        return hits
+
+    def _match_regexes(self, content: str, author_id: int, author_bot: bool, hits):
+        deadline = time.perf_counter() + REGEX_BUDGET
+        for group in self.regexes.values():
+            if group.strikes >= MAX_REGEX_STRIKES:
+                continue
+            entries = [x for x in group.owners.values() if _accepts(x, author_id, author_bot)]
+            if not entries:
+                continue
+            start = time.perf_counter()
+            if start > deadline:
+                logger.debug("Highlight regex budget exhausted, skipping remaining patterns.")
+                return
+            matched = group.pattern.search(content) is not None
+            if time.perf_counter() - start > REGEX_BUDGET:
+                group.strikes += 1
+                logger.warning(
+                    f"Highlight pattern {group.pattern.pattern!r} exceeded the time budget "
+                    f"({group.strikes}/{MAX_REGEX_STRIKES})."
+                )
+            if matched:
+                for entry in entries:
+                    hits.setdefault(entry.user, []).append(entry.word)
+
+
+class RegexGroup:
+    """A compiled highlight pattern and the users who registered it."""
+
+    __slots__ = ("pattern", "owners", "strikes")
+
+    def __init__(self, pattern: Pattern):
+        self.pattern = pattern
+        self.owners: Dict[int, Entry] = {}
+        self.strikes = 0
+
+
+def _accepts(entry: Entry, author_id: int, author_bot: bool) -> bool:
+    if entry.user == author_id or not entry.toggle:
+        return False
+    return entry.bots or not author_bot
@@ -21,6 +21,12 @@ exit /B %ERRORLEVEL%
 black -l 99 --check !PYFILES!
 exit /B %ERRORLEVEL%
 
+:bench
+python highlight/benchmark.py
+if ERRORLEVEL 1 exit /B %ERRORLEVEL%
+python antispam/benchmark.py
+exit /B %ERRORLEVEL%
+
 :help
 echo Usage:
 echo   make ^<command^>
@@ -28,3 +34,4 @@ echo.
 echo Commands:
 echo   reformat                   Reformat all .py files being tracked by git.
 echo   stylecheck                 Check which tracked .py files need reformatting.
+echo   bench                      Run the cog benchmarks.
@@ -1,7 +1,7 @@
 from .redditpost import RedditPost
 
 
-def setup(bot):
+async def setup(bot):
     cog = RedditPost(bot)
-    cog.init()
+    await cog.initialize()
     bot.add_cog(cog)
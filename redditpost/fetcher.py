@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+
+log = logging.getLogger("red.flare.redditpost")
+
+# Feeds fetched at the same time.
+FETCH_CONCURRENCY = 16
+# Listings fetched within this many seconds are served from memory.
+LISTING_TTL = 10
+# Posts kept per listing, the same as reddit returns by default.
+LISTING_LIMIT = 25
+# Listings are fetched in full again this often in case the newest post was removed, which
+# leaves ``before=`` paging returning nothing.
+FULL_REFRESH = 3600
+# Paged fetches without new posts in a row before the full listing is fetched as well, so a
+# removed newest post stops a feed for a few polls rather than up to FULL_REFRESH.
+STALE_POLLS = 3
+
+
+class FeedState:
+    """What is known about a listing URL from the last time it was fetched."""
+
+    __slots__ = ("listing", "fetched", "refreshed", "empty_polls", "validators", "error")
+
+    def __init__(self):
+        self.listing: List[dict] = []
+        self.fetched = 0.0
+        self.refreshed = 0.0
+        self.empty_polls = 0
+        # Request URL, ETag and Last-Modified of the last full and the last paged request, keyed
+        # by whether it was paged, so both kinds stay conditional when they alternate.
+        self.validators: Dict[bool, Tuple[str, Optional[str], Optional[str]]] = {}
+        # None if the last fetch worked, otherwise how many seconds reddit asked us to wait.
+        self.error: Optional[float] = None
+
+
+class FeedFetcher:
+    """Fetches subreddit listings, transferring as little as possible.
+
+    Only posts newer than the newest known one are requested with ``before=``, and the request
+    is made conditional when it is the same as the last full or paged one, so quiet subreddits
+    come back as empty listings or 304s. Parsed listings are shared for a few seconds between every caller.
+    """
+
+    def __init__(self, session: aiohttp.ClientSession):
+        self.session = session
+        self.semaphore = asyncio.Semaphore(FETCH_CONCURRENCY)
+        self.feeds: Dict[str, FeedState] = {}
+
+    @staticmethod
+    def request_url(url: str, before: Optional[str]) -> str:
+        separator = "&" if "?" in url else "?"
+        if before is not None:
+            return f"{url}{separator}limit={LISTING_LIMIT}&before={before}"
+        return f"{url}{separator}limit={LISTING_LIMIT}"
+
+    async def fetch(self, url: str) -> Optional[List[dict]]:
+        """Return the newest posts of a listing, newest first, or None if there are none."""
+        now = time.monotonic()
+        state = self.feeds.get(url)
+        if state is not None and now - state.fetched < LISTING_TTL:
+            return state.listing or None
+        if state is None:
+            state = self.feeds[url] = FeedState()
+        paged = bool(state.listing) and now - state.refreshed < FULL_REFRESH
+        new = await self.request(url, state, now, paged)
+        if paged and new == 0:
+            # Paging keeps coming back empty once the post it pages from is removed, so a feed
+            # that stays quiet is checked against the full listing every few polls.
+            state.empty_polls += 1
+            if state.empty_polls >= STALE_POLLS:
+                new = await self.request(url, state, now, False)
+        elif new:
+            state.empty_polls = 0
+        if new is None:
+            return None
+        return state.listing or None
+
+    async def request(self, url: str, state: FeedState, now: float, paged: bool) -> Optional[int]:
+        """Fetch url into state, returning how many new posts came back or None on errors."""
+        request_url = self.request_url(url, state.listing[0]["data"]["name"] if paged else None)
+        headers = {}
+        last_url, etag, last_modified = state.validators.get(paged, (None, None, None))
+        if request_url == last_url:
+            if etag is not None:
+                headers["If-None-Match"] = etag
+            if last_modified is not None:
+                headers["If-Modified-Since"] = last_modified
+        timeout = aiohttp.client.ClientTimeout(total=15)
+        try:
+            async with self.semaphore, self.session.get(
+                request_url, headers=headers, timeout=timeout
+            ) as response:
+                if response.status == 304:
+                    if not paged:
+                        state.refreshed = now
+                        state.empty_polls = 0
+                    state.fetched = now
+                    state.error = None
+                    return 0
+                if response.status == 429:
+                    try:
+                        state.error = float(response.headers.get("Retry-After", 0))
+                    except ValueError:
+                        state.error = 0.0
+                    return None
+                if response.status != 200:
+                    state.error = 0.0
+                    return None
+                children = (await response.json())["data"]["children"]
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            state.error = 0.0
+            return None
+        except Exception as exc:
+            log.info(
+                f"Unexpected exception type {type(exc)} encountered for feed url: {url}",
+                exc_info=exc,
+            )
+            state.error = 0.0
+            return None
+        if paged:
+            new = len(children)
+            state.listing = (children + state.listing)[:LISTING_LIMIT]
+        else:
+            known = {post["data"]["name"] for post in state.listing}
+            new = sum(1 for post in children if post["data"]["name"] not in known)
+            state.listing = children[:LISTING_LIMIT]
+            state.refreshed = now
+            state.empty_polls = 0
+        state.fetched = now
+        state.validators[paged] = (request_url, etag, last_modified)
+        state.error = None
+        return new
+
+    def forget(self, url: str):
+        self.feeds.pop(url, None)
+
+    def error(self, url: str) -> Optional[float]:
+        """None if the last fetch of url worked, otherwise the seconds reddit asked to wait."""
+        state = self.feeds.get(url)
+        return state.error if state is not None else None
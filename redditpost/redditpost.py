@@ -1,8 +1,9 @@
 import asyncio
 import logging
+import time
 from datetime import datetime, timedelta
 from html import unescape
-from typing import Optional
+from typing import Dict, List, Optional, Set
 
 import aiohttp
 import discord
@@ -12,15 +13,41 @@ from redbot.core import Config, commands
 from redbot.core.commands.converter import TimedeltaConverter
 from redbot.core.utils.chat_formatting import box, pagify
 
+from .fetcher import FeedFetcher
+from .scheduler import FeedScheduler
+
 log = logging.getLogger("red.flare.redditpost")
 
 REDDIT_LOGO = "https://www.redditinc.com/assets/images/site/reddit-logo.png"
+# Connections kept open to reddit.com at once.
+CONNECTIONS_PER_HOST = 8
+# Messages sent to Discord at once across every channel.
+SEND_CONCURRENCY = 5
+# Discord allows up to 10 embeds per webhook message, with 6000 characters between them.
+WEBHOOK_EMBEDS = 10
+WEBHOOK_CHARACTERS = 6000
+
+
+def embed_batches(embeds: List[discord.Embed]) -> List[List[discord.Embed]]:
+    batches = []
+    size = 0
+    for embed in embeds:
+        if (
+            not batches
+            or len(batches[-1]) >= WEBHOOK_EMBEDS
+            or size + len(embed) > WEBHOOK_CHARACTERS
+        ):
+            batches.append([])
+            size = 0
+        batches[-1].append(embed)
+        size += len(embed)
+    return batches
 
 
 class RedditPost(commands.Cog):
     """A reddit auto posting cog."""
 
-    __version__ = "0.1.3"
+    __version__ = "0.6.0"
 
     def format_help_for_context(self, ctx):
         """Thanks Sinbad."""
@@ -31,60 +58,170 @@ class RedditPost(commands.Cog):
         self.bot = bot
         self.config = Config.get_conf(self, identifier=959327661803438081, force_registration=True)
         self.config.register_channel(reddits={})
-        self.config.register_global(delay=300)
-        self.session = aiohttp.ClientSession()
+        self.config.register_global(delay=300, min_delay=60, max_delay=900)
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit_per_host=CONNECTIONS_PER_HOST)
+        )
+        self.fetcher = FeedFetcher(self.session)
+        self.scheduler = FeedScheduler(300, 60, 900)
+        self.wakeup = asyncio.Event()
+        # Every channel's feeds, Config is only written to and never read after startup.
+        self.feeds: Dict[int, Dict[str, dict]] = {}
+        # Channels with a last_post that moved since the last save.
+        self.dirty_channels: Set[int] = set()
+        self.webhooks: Dict[int, discord.Webhook] = {}
+        self.send_semaphore = asyncio.Semaphore(SEND_CONCURRENCY)
         self.bg_loop_task: Optional[asyncio.Task] = None
 
-    def init(self):
+    async def initialize(self):
+        self.feeds = {
+            channel_id: data["reddits"]
+            for channel_id, data in (await self.config.all_channels()).items()
+            if data["reddits"]
+        }
         self.bg_loop_task = self.bot.loop.create_task(self.bg_loop())
 
     def cog_unload(self):
         if self.bg_loop_task:
             self.bg_loop_task.cancel()
-        self.bot.loop.create_task(self.session.close())
+        self.bot.loop.create_task(self.close())
+
+    async def close(self):
+        await self.save_last_posts()
+        await self.session.close()
+
+    async def save_channel(self, channel: discord.TextChannel):
+        await self.config.channel(channel).reddits.set(self.feeds.get(channel.id, {}))
+
+    async def save_last_posts(self):
+        """Write the feeds of every channel whose last_post moved since the last save."""
+        channels, self.dirty_channels = self.dirty_channels, set()
+        while channels:
+            channel_id = channels.pop()
+            try:
+                await self.config.channel_from_id(channel_id).reddits.set(
+                    self.feeds.get(channel_id, {})
+                )
+            except BaseException:
+                self.dirty_channels |= channels
+                self.dirty_channels.add(channel_id)
+                raise
+
+    async def configure_scheduler(self):
+        settings = await self.config.all()
+        self.scheduler.configure(settings["delay"], settings["min_delay"], settings["max_delay"])
 
     async def bg_loop(self):
         await self.bot.wait_until_ready()
+        await self.configure_scheduler()
         while True:
             try:
                 await self.do_feeds()
-                delay = await self.config.delay()
-                await asyncio.sleep(delay)
+                next_due = self.scheduler.next_due()
+                delay = (
+                    self.scheduler.delay
+                    if next_due is None
+                    else max(0, next_due - time.monotonic())
+                )
+                # Adding a feed wakes the loop up early so it is polled straight away.
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                self.wakeup.clear()
             except Exception as exc:
                 log.error("Exception in bg_loop: ", exc_info=exc)
                 msg = "An exception occured in the background loop for `redditpost`. Check your logs for more details and if possible, report them to the cog creator."
                 await self.bot.send_to_owners(msg)
 
     async def do_feeds(self):
-        feeds = {}
-        channel_data = await self.config.all_channels()
-        for channel_id, data in channel_data.items():
-
+        to_send = []
+        for channel_id, feeds in self.feeds.items():
             channel = self.bot.get_channel(channel_id)
             if not channel:
                 continue
-            for sub, feed in data["reddits"].items():
-                url = feed.get("url", None)
-                if not url:
-                    continue
-                if url in feeds:
-                    response = feeds[url]
-                else:
-                    response = await self.fetch_feed(url)
-                    feeds[url] = response
-                if response is None:
-                    continue
-                time = await self.format_send(
-                    response,
-                    channel,
-                    feed["last_post"],
-                    feed.get("latest", True),
-                    feed.get("webhooks", False),
-                    feed.get("logo", REDDIT_LOGO),
-                )
-                if time is not None:
-                    async with self.config.channel(channel).reddits() as feeds:
-                        feeds[sub]["last_post"] = time
+            for sub, feed in feeds.items():
+                if feed.get("url", None):
+                    to_send.append((channel, sub, feed))
+        now = time.monotonic()
+        self.scheduler.sync((feed["url"] for _, _, feed in to_send), now)
+        for url in self.fetcher.feeds.keys() - self.scheduler.feeds.keys():
+            self.fetcher.forget(url)
+        # Every due subreddit is fetched once up front, so a slow one only holds up the cycle
+        # for its own request rather than every feed after it.
+        urls = self.scheduler.pop_due(now)
+        results = await asyncio.gather(*map(self.fetch_feed, urls), return_exceptions=True)
+        now = time.monotonic()
+        responses = {}
+        # Popped urls are only pushed back by success or failure, so every one must get either.
+        for url, response in zip(urls, results):
+            if isinstance(response, Exception):
+                log.error(f"Exception while fetching feed {url}: ", exc_info=response)
+                self.scheduler.failure(url, now)
+                continue
+            responses[url] = response
+            error = self.fetcher.error(url)
+            if error is None:
+                self.scheduler.success(url, response, now)
+            else:
+                self.scheduler.failure(url, now, error)
+        by_channel = {}
+        for channel, sub, feed in to_send:
+            response = responses.get(feed["url"])
+            if response is not None:
+                by_channel.setdefault(channel, []).append((feed, response))
+        # Channels don't depend on each other, send_semaphore keeps the total rate in check.
+        results = await asyncio.gather(
+            *(self.send_channel(channel, items) for channel, items in by_channel.items()),
+            return_exceptions=True,
+        )
+        for channel, result in zip(by_channel, results):
+            if isinstance(result, Exception):
+                log.error(f"Exception while sending feeds to {channel.id}: ", exc_info=result)
+        await self.save_last_posts()
+
+    async def send_channel(self, channel: discord.TextChannel, items: List[tuple]):
+        for feed, response in items:
+            last_post = await self.format_send(
+                response,
+                channel,
+                feed["last_post"],
+                feed.get("latest", True),
+                feed.get("webhooks", False),
+                feed.get("logo", REDDIT_LOGO),
+            )
+            if last_post is not None and last_post != feed["last_post"]:
+                feed["last_post"] = last_post
+                self.dirty_channels.add(channel.id)
+
+    @commands.Cog.listener()
+    async def on_webhooks_update(self, channel):
+        self.webhooks.pop(channel.id, None)
+
+    async def get_webhook(self, channel: discord.TextChannel) -> discord.Webhook:
+        webhook = self.webhooks.get(channel.id)
+        if webhook is not None:
+            return webhook
+        for hook in await channel.webhooks():
+            if hook.name == channel.guild.me.name:
+                webhook = hook
+        if webhook is None:
+            webhook = await channel.create_webhook(name=channel.guild.me.name)
+        self.webhooks[channel.id] = webhook
+        return webhook
+
+    async def send_webhook(self, channel: discord.TextChannel, embeds, username: str, icon: str):
+        for attempt in range(2):
+            webhook = await self.get_webhook(channel)
+            try:
+                async with self.send_semaphore:
+                    await webhook.send(username=username, avatar_url=icon, embeds=embeds)
+                return
+            except discord.NotFound:
+                # The cached webhook was deleted, fetch or create it again once.
+                self.webhooks.pop(channel.id, None)
+                if attempt:
+                    raise
 
     @commands.admin()
     @commands.group(aliases=["redditfeed"])
@@ -100,11 +237,33 @@ class RedditPost(commands.Cog):
             minimum=timedelta(seconds=15), maximum=timedelta(seconds=900), default_unit="seconds"
         ),
     ):
-        """Set the delay used to check for new content."""
-        time = seconds.total_seconds()
-        await self.config.delay.set(time)
+        """Set the delay new feeds start being checked at.
+
+        Each feed's delay then adapts to how often it gets new posts.
+        """
+        await self.config.delay.set(seconds.total_seconds())
+        await self.configure_scheduler()
+        await ctx.tick()
+
+    @redditpost.command()
+    @commands.is_owner()
+    async def bounds(
+        self,
+        ctx,
+        minimum: TimedeltaConverter(
+            minimum=timedelta(seconds=15), maximum=timedelta(hours=1), default_unit="seconds"
+        ),
+        maximum: TimedeltaConverter(
+            minimum=timedelta(seconds=15), maximum=timedelta(hours=1), default_unit="seconds"
+        ),
+    ):
+        """Set the shortest and longest delay a feed can be checked at."""
+        if minimum > maximum:
+            return await ctx.send("The minimum delay can't be longer than the maximum.")
+        await self.config.min_delay.set(minimum.total_seconds())
+        await self.config.max_delay.set(maximum.total_seconds())
+        await self.configure_scheduler()
         await ctx.tick()
-        await ctx.send("This delay will come into effect on the next loop.")
 
     @redditpost.command()
     @commands.bot_has_permissions(send_messages=True, embed_links=True)
@@ -130,24 +289,28 @@ class RedditPost(commands.Cog):
                 )
             logo = REDDIT_LOGO if not data["data"]["icon_img"] else data["data"]["icon_img"]
 
-        async with self.config.channel(channel).reddits() as feeds:
-            if subreddit in feeds:
-                return await ctx.send("That subreddit is already set to post.")
+        if subreddit in self.feeds.get(channel.id, {}):
+            return await ctx.send("That subreddit is already set to post.")
 
-            url = f"https://www.reddit.com/r/{subreddit}/new.json?sort=new"
+        url = f"https://www.reddit.com/r/{subreddit}/new.json?sort=new"
 
-            response = await self.fetch_feed(url)
+        response = await self.fetch_feed(url)
 
-            if response is None:
-                return await ctx.send(f"That didn't seem to be a valid rss feed.")
+        if response is None:
+            return await ctx.send(f"That didn't seem to be a valid rss feed.")
 
-            feeds[subreddit] = {
-                "url": url,
-                "last_post": datetime.now().timestamp(),
-                "latest": True,
-                "logo": logo,
-                "webhooks": False,
-            }
+        feeds = self.feeds.setdefault(channel.id, {})
+        if subreddit in feeds:
+            return await ctx.send("That subreddit is already set to post.")
+        feeds[subreddit] = {
+            "url": url,
+            "last_post": datetime.now().timestamp(),
+            "latest": True,
+            "logo": logo,
+            "webhooks": False,
+        }
+        await self.save_channel(channel)
+        self.wakeup.set()
         await ctx.tick()
 
     @redditpost.command()
@@ -157,7 +320,7 @@ class RedditPost(commands.Cog):
 
         channel = channel or ctx.channel
 
-        data = await self.config.channel(channel).reddits()
+        data = self.feeds.get(channel.id)
         if not data:
             return await ctx.send("No subreddits here.")
         output = [[k, v.get("webhooks", "False"), v.get("latest", True)] for k, v in data.items()]
@@ -179,13 +342,15 @@ class RedditPost(commands.Cog):
     ):
         """Removes a subreddit from the current channel, or a provided one."""
         channel = channel or ctx.channel
-        async with self.config.channel(channel).reddits() as feeds:
-            if subreddit not in feeds:
-                await ctx.send(f"No subreddit named {subreddit} in {channel.mention}.")
-                return
-
-            del feeds[subreddit]
+        feeds = self.feeds.get(channel.id, {})
+        if subreddit not in feeds:
+            await ctx.send(f"No subreddit named {subreddit} in {channel.mention}.")
+            return
 
+        del feeds[subreddit]
+        if not feeds:
+            self.feeds.pop(channel.id, None)
+        await self.save_channel(channel)
         await ctx.tick()
 
     @redditpost.command(name="force")
@@ -193,7 +358,7 @@ class RedditPost(commands.Cog):
     async def force(self, ctx, subreddit: str, channel: Optional[discord.TextChannel] = None):
         """Force the latest post."""
         channel = channel or ctx.channel
-        feeds = await self.config.channel(channel).reddits()
+        feeds = self.feeds.get(channel.id, {})
         if subreddit not in feeds:
             await ctx.send(f"No subreddit named {subreddit} in {channel.mention}.")
             return
@@ -216,13 +381,13 @@ class RedditPost(commands.Cog):
     async def latest(self, ctx, subreddit: str, latest: bool, channel: discord.TextChannel = None):
         """Whether to fetch all posts or just the latest post."""
         channel = channel or ctx.channel
-        async with self.config.channel(channel).reddits() as feeds:
-            if subreddit not in feeds:
-                await ctx.send(f"No subreddit named {subreddit} in {channel.mention}.")
-                return
-
-            feeds[subreddit]["latest"] = latest
+        feeds = self.feeds.get(channel.id, {})
+        if subreddit not in feeds:
+            await ctx.send(f"No subreddit named {subreddit} in {channel.mention}.")
+            return
 
+        feeds[subreddit]["latest"] = latest
+        await self.save_channel(channel)
         await ctx.tick()
 
     @redditpost.command(name="webhook", aliases=["webhooks"])
@@ -232,12 +397,13 @@ class RedditPost(commands.Cog):
     ):
         """Whether to send the post as a webhook or message from the bot."""
         channel = channel or ctx.channel
-        async with self.config.channel(channel).reddits() as feeds:
-            if subreddit not in feeds:
-                await ctx.send(f"No subreddit named {subreddit} in {channel.mention}.")
-                return
+        feeds = self.feeds.get(channel.id, {})
+        if subreddit not in feeds:
+            await ctx.send(f"No subreddit named {subreddit} in {channel.mention}.")
+            return
 
-            feeds[subreddit]["webhooks"] = webhook
+        feeds[subreddit]["webhooks"] = webhook
+        await self.save_channel(channel)
 
         if webhook:
             await ctx.send(f"New posts from r/{subreddit} will be sent as webhooks.")
@@ -247,36 +413,13 @@ class RedditPost(commands.Cog):
         await ctx.tick()
 
     async def fetch_feed(self, url: str):
-        timeout = aiohttp.client.ClientTimeout(total=15)
-        try:
-            async with self.session.get(url, timeout=timeout) as response:
-                if response.status == 200:
-                    data = await response.json()
-                else:
-                    return None
-        except (aiohttp.ClientError, asyncio.TimeoutError):
-            return None
-        except Exception as exc:
-            log.info(
-                f"Unexpected exception type {type(exc)} encountered for feed url: {url}",
-                exc_info=exc,
-            )
-            return None
-        if data["data"]["dist"] > 0:
-            return data["data"]["children"]
-        return None
+        return await self.fetcher.fetch(url)
 
     async def format_send(self, data, channel, last_post, latest, webhook_set, icon):
         timestamps = []
         embeds = []
         data = data[:1] if latest else data
-        webhook = None
-        if webhook_set and channel.permissions_for(channel.guild.me).manage_webhooks:
-            for hook in await channel.webhooks():
-                if hook.name == channel.guild.me.name:
-                    webhook = hook
-            if webhook is None:
-                webhook = await channel.create_webhook(name=channel.guild.me.name)
+        use_webhook = webhook_set and channel.permissions_for(channel.guild.me).manage_webhooks
         for feed in data:
             feed = feed["data"]
             timestamp = feed["created_utc"]
@@ -313,13 +456,13 @@ class RedditPost(commands.Cog):
         if timestamps:
             if embeds:
                 try:
-                    for emb in embeds[::-1]:
-                        if webhook is None:
-                            await channel.send(embed=emb)
-                        else:
-                            await webhook.send(
-                                username=f"r/{feed['subreddit']}", avatar_url=icon, embed=emb
-                            )
+                    if use_webhook:
+                        for batch in embed_batches(embeds[::-1]):
+                            await self.send_webhook(channel, batch, f"r/{feed['subreddit']}", icon)
+                    else:
+                        for emb in embeds[::-1]:
+                            async with self.send_semaphore:
+                                await channel.send(embed=emb)
                 except discord.HTTPException as exc:
                     log.error("Exception in bg_loop while sending message: ", exc_info=exc)
             return timestamps[0]
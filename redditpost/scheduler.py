@@ -0,0 +1,104 @@
+import heapq
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Longest a feed is left alone after repeated errors.
+MAX_BACKOFF = 3600
+# How much the interval grows after a poll without new posts.
+IDLE_GROWTH = 1.5
+
+
+class FeedSchedule:
+    """Polling state of a single listing URL."""
+
+    __slots__ = ("interval", "due", "polled", "newest", "failures")
+
+    def __init__(self, interval: float, due: float):
+        self.interval = interval
+        self.due = due
+        self.polled: Optional[float] = None
+        self.newest = 0.0
+        self.failures = 0
+
+
+class FeedScheduler:
+    """Decides when every feed is polled next, keeping feeds in a heap by due time.
+
+    A feed's interval moves towards the average gap between its posts, growing while nothing
+    new shows up, and always stays between ``minimum`` and ``maximum``. Failed polls back off
+    exponentially instead, up to ``MAX_BACKOFF`` or however long reddit asked us to wait.
+    """
+
+    def __init__(self, delay: float, minimum: float, maximum: float):
+        self.delay = delay
+        self.minimum = minimum
+        self.maximum = maximum
+        self.feeds: Dict[str, FeedSchedule] = {}
+        self.heap: List[Tuple[float, str]] = []
+
+    def configure(self, delay: float, minimum: float, maximum: float):
+        self.delay = delay
+        self.minimum = minimum
+        self.maximum = maximum
+        for schedule in self.feeds.values():
+            schedule.interval = self.clamp(schedule.interval)
+
+    def clamp(self, interval: float) -> float:
+        return min(self.maximum, max(self.minimum, interval))
+
+    def sync(self, urls: Iterable[str], now: float):
+        """Track exactly urls, new ones are due straight away."""
+        urls = set(urls)
+        for url in self.feeds.keys() - urls:
+            # Its heap items are skipped once popped.
+            del self.feeds[url]
+        for url in urls - self.feeds.keys():
+            self.feeds[url] = FeedSchedule(self.clamp(self.delay), now)
+            heapq.heappush(self.heap, (now, url))
+
+    def pop_due(self, now: float) -> List[str]:
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            when, url = heapq.heappop(self.heap)
+            schedule = self.feeds.get(url)
+            if schedule is not None and schedule.due == when:
+                due.append(url)
+        return due
+
+    def next_due(self) -> Optional[float]:
+        while self.heap:
+            when, url = self.heap[0]
+            schedule = self.feeds.get(url)
+            if schedule is not None and schedule.due == when:
+                return when
+            heapq.heappop(self.heap)
+        return None
+
+    def reschedule(self, url: str, schedule: FeedSchedule, due: float):
+        schedule.due = due
+        heapq.heappush(self.heap, (due, url))
+
+    def success(self, url: str, listing: Optional[List[dict]], now: float):
+        schedule = self.feeds.get(url)
+        if schedule is None:
+            return
+        schedule.failures = 0
+        times = [post["data"]["created_utc"] for post in listing or ()]
+        new = sum(1 for created in times if created > schedule.newest)
+        if schedule.polled is not None:
+            if new:
+                gap = (now - schedule.polled) / new
+                schedule.interval = self.clamp((schedule.interval + gap) / 2)
+            else:
+                schedule.interval = self.clamp(schedule.interval * IDLE_GROWTH)
+        if times:
+            schedule.newest = max(schedule.newest, max(times))
+        schedule.polled = now
+        self.reschedule(url, schedule, now + schedule.interval)
+
+    def failure(self, url: str, now: float, retry_after: float = 0):
+        schedule = self.feeds.get(url)
+        if schedule is None:
+            return
+        schedule.failures += 1
+        backoff = min(MAX_BACKOFF, schedule.interval * 2**schedule.failures)
+        self.reschedule(url, schedule, now + max(backoff, retry_after))
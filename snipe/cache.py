@@ -0,0 +1,141 @@
+import heapq
+import sys
+import zlib
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Hashable, List, Tuple, Union
+
+# Deleted or edited messages kept per channel.
+SNIPES_PER_CHANNEL = 10
+# Content is cut to what fits in an embed description.
+MAX_CONTENT = 2000
+# Content longer than this is stored zlib compressed.
+COMPRESS_THRESHOLD = 256
+
+
+class SnipeRecord:
+    """A cached deleted or edited message.
+
+    Timestamps are whole seconds since the epoch and long content is kept compressed, the
+    record's size is worked out once so the cache can account for it cheaply.
+    """
+
+    __slots__ = ("_content", "author", "message", "timestamp", "expiry", "attachments", "size")
+
+    def __init__(
+        self,
+        content: str,
+        author: int,
+        message: int,
+        timestamp: int,
+        expiry: int,
+        attachments: Tuple[str, ...] = (),
+    ):
+        if len(content) > MAX_CONTENT:
+            content = content[: MAX_CONTENT - 1] + "\N{HORIZONTAL ELLIPSIS}"
+        self._content: Union[str, bytes] = content
+        if len(content) > COMPRESS_THRESHOLD:
+            compressed = zlib.compress(content.encode("utf-8"))
+            if len(compressed) < len(content):
+                self._content = compressed
+        self.author = author
+        self.message = message
+        self.timestamp = timestamp
+        self.expiry = expiry
+        self.attachments = attachments
+        self.size = (
+            sys.getsizeof(self)
+            + sys.getsizeof(self._content)
+            + sys.getsizeof(attachments)
+            + sum(map(sys.getsizeof, attachments))
+        )
+
+    @property
+    def content(self) -> str:
+        if isinstance(self._content, bytes):
+            return zlib.decompress(self._content).decode("utf-8")
+        return self._content
+
+
+class SnipeCache:
+    """The last deleted and edited messages of every channel, within a shared memory budget.
+
+    Buffers are keyed by (channel id, kind), so deleted and edited messages are kept apart.
+
+    Channels are kept in least recently used order, once the budget is exceeded the oldest
+    messages of the least recently used channels are dropped first. Every entry pushes its
+    expiry onto a heap, so sweeping only looks at channels that have something to expire.
+    """
+
+    def __init__(self, budget: int, size: int = SNIPES_PER_CHANNEL):
+        self.budget = budget
+        self.size = size
+        self.channels: "OrderedDict[Hashable, Deque[SnipeRecord]]" = OrderedDict()
+        self.heap: List[Tuple[float, Hashable]] = []
+        self.bytes = 0
+
+    def __len__(self):
+        return sum(len(buffer) for buffer in self.channels.values())
+
+    def add(self, key: Hashable, entry: SnipeRecord):
+        self.add_many(key, [entry])
+
+    def add_many(self, key: Hashable, entries: List[SnipeRecord]):
+        """Add entries to key's buffer in one go, oldest first."""
+        if not entries:
+            return
+        buffer = self.channels.get(key)
+        if buffer is None:
+            buffer = self.channels[key] = deque()
+        else:
+            self.channels.move_to_end(key)
+        # Only the newest entries fit in the buffer, skip the rest entirely.
+        for entry in entries[-self.size :]:
+            if len(buffer) >= self.size:
+                self.bytes -= buffer.popleft().size
+            buffer.append(entry)
+            self.bytes += entry.size
+            heapq.heappush(self.heap, (entry.expiry, key))
+        self.evict()
+
+    def evict(self):
+        while self.bytes > self.budget and self.channels:
+            key, buffer = next(iter(self.channels.items()))
+            self.bytes -= buffer.popleft().size
+            if not buffer:
+                del self.channels[key]
+
+    def get(self, key: Hashable, now: float) -> List[SnipeRecord]:
+        """Return the unexpired entries of key, newest first."""
+        buffer = self.channels.get(key)
+        if buffer is None:
+            return []
+        self.channels.move_to_end(key)
+        return [entry for entry in reversed(buffer) if entry.expiry > now]
+
+    def sweep(self, now: float) -> int:
+        """Drop every expired entry, returning how many were removed."""
+        removed = 0
+        while self.heap and self.heap[0][0] <= now:
+            _, key = heapq.heappop(self.heap)
+            buffer = self.channels.get(key)
+            if buffer is None:
+                continue
+            kept = [entry for entry in buffer if entry.expiry > now]
+            if len(kept) == len(buffer):
+                continue
+            removed += len(buffer) - len(kept)
+            self.bytes -= sum(entry.size for entry in buffer) - sum(entry.size for entry in kept)
+            if kept:
+                self.channels[key] = deque(kept)
+            else:
+                del self.channels[key]
+        return removed
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "buffers": len(self.channels),
+            "entries": len(self),
+            "bytes": self.bytes,
+            "budget": self.budget,
+            "heap": len(self.heap),
+        }
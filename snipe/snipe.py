@@ -1,19 +1,28 @@
 import asyncio
 import logging
-from datetime import datetime, timedelta
+import time
+from datetime import datetime, timedelta, timezone
 from typing import Optional
 
 import discord
 from redbot.core import Config, checks, commands
 from redbot.core.commands.converter import TimedeltaConverter
+from redbot.core.utils.chat_formatting import humanize_number
+from redbot.core.utils.menus import DEFAULT_CONTROLS, menu
+
+from .cache import SnipeCache, SnipeRecord
 
 log = logging.getLogger("red.flare.snipe")
 
+DEFAULT_BUDGET = 8 * 1024 * 1024
+DELETED = "deleted"
+EDITED = "edited"
+
 
 class Snipe(commands.Cog):
     """Snipe the last message from a server."""
 
-    __version__ = "0.1.0"
+    __version__ = "0.4.0"
 
     def format_help_for_context(self, ctx):
         """Thanks Sinbad."""
@@ -24,14 +33,17 @@ class Snipe(commands.Cog):
         defaults_guild = {"toggle": False, "timeout": 30}
         self.config = Config.get_conf(self, identifier=95932766180343808, force_registration=True)
         self.config.register_guild(**defaults_guild)
-        self.config.register_global(timer=60)
+        self.config.register_global(timer=60, budget=DEFAULT_BUDGET)
         self.bot = bot
-        self.cache = {}
+        self.cache = SnipeCache(DEFAULT_BUDGET)
         self.snipe_loop_task: Optional[asyncio.Task] = None
+        self.timer = 60
 
     async def init(self):
         self.snipe_loop_task = self.bot.loop.create_task(self.snipe_loop())
         await self.generate_cache()
+        self.cache.budget = await self.config.budget()
+        self.timer = await self.config.timer()
 
     def cog_unload(self):
         if self.snipe_loop_task:
@@ -41,16 +53,8 @@ class Snipe(commands.Cog):
         await self.bot.wait_until_ready()
         while True:
             try:
-                to_delete = []
-                for guild in self.cache:
-                    for channel in self.cache[guild]:
-                        if datetime.utcnow() - self.cache[guild][channel]["timestamp"] > timedelta(
-                            seconds=self.config_cache[guild]["timeout"]
-                        ):
-                            to_delete.append([guild, channel])
-                for entry in to_delete:
-                    del self.cache[entry[0]][entry[1]]
-                await asyncio.sleep(await self.config.timer())
+                self.cache.sweep(time.time())
+                await asyncio.sleep(self.timer)
             except Exception as exc:
                 log.error("Exception occured in snipe loop: ", exc_info=exc)
                 break
@@ -58,15 +62,20 @@ class Snipe(commands.Cog):
     async def generate_cache(self):
         self.config_cache = await self.config.all_guilds()
 
+    def snipe_config(self, guild_id: Optional[int]) -> Optional[dict]:
+        """The cached settings of a guild with sniping enabled, None otherwise."""
+        if guild_id is None:
+            return None
+        config = self.config_cache.get(guild_id)
+        if not config or not config["toggle"]:
+            return None
+        return config
+
     @commands.Cog.listener()
     async def on_raw_message_delete(self, payload):
         guild_id = payload.guild_id
-        if guild_id is None:
-            return
-        config = self.config_cache.get(guild_id)
-        if not config:
-            return
-        if not config["toggle"]:
+        config = self.snipe_config(guild_id)
+        if config is None:
             return
         message = payload.cached_message
         if message is None:
@@ -76,61 +85,161 @@ class Snipe(commands.Cog):
             return
         if message.author.bot:
             return
-        self.add_cache_entry(message, guild_id, payload.channel_id)
+        self.add_cache_entries([message], config, payload.channel_id, DELETED)
 
-    def add_cache_entry(self, message, guild, channel):
-        if guild not in self.cache:
-            self.cache[guild] = {}
-        self.cache[guild][channel] = {
-            "content": message.content,
-            "author": message.author.id,
-            "timestamp": message.created_at,
-        }
+    @commands.Cog.listener()
+    async def on_raw_bulk_message_delete(self, payload):
+        config = self.snipe_config(payload.guild_id)
+        if config is None:
+            return
+        messages = sorted(
+            (message for message in payload.cached_messages if not message.author.bot),
+            key=lambda message: message.id,
+        )
+        self.add_cache_entries(messages, config, payload.channel_id, DELETED)
 
-    @commands.cooldown(rate=1, per=5, type=commands.BucketType.channel)
-    @commands.command()
-    async def snipe(self, ctx, channel: Optional[discord.TextChannel] = None):
-        """Shows the last deleted message from a specified channel."""
-        channel = channel or ctx.channel
-        if not await self.config.guild(ctx.guild).toggle():
-            await ctx.send(
-                f"Sniping is not allowed in this server! An admin may turn it on by typing the `{ctx.clean_prefix}snipeset enable` command."
-            )
+    @commands.Cog.listener()
+    async def on_raw_message_edit(self, payload):
+        # Embeds being resolved also dispatch edits, these don't carry any new content.
+        if "content" not in payload.data:
             return
-        guildcache = self.cache.get(ctx.guild.id, None)
-        if guildcache is None:
-            await ctx.send("There's nothing to snipe!")
+        config = self.snipe_config(payload.data.get("guild_id") and int(payload.data["guild_id"]))
+        if config is None:
             return
-        channelsnipe = guildcache.get(channel.id, None)
-        if channelsnipe is None:
-            await ctx.send("There's nothing to snipe!")
+        message = payload.cached_message
+        if message is None or message.author.bot:
             return
-        if datetime.utcnow() - channelsnipe["timestamp"] > timedelta(
-            seconds=await self.config.guild(ctx.guild).timeout()
-        ):
-            del self.cache[ctx.guild.id][channel.id]
-            await ctx.send("There's nothing to snipe!")
+        if message.content == payload.data["content"]:
             return
-        del self.cache[ctx.guild.id][channel.id]
-        author = ctx.guild.get_member(channelsnipe["author"])
-        if not channelsnipe["content"]:
+        self.add_cache_entries([message], config, payload.channel_id, EDITED)
+
+    def add_cache_entries(self, messages, config, channel, kind):
+        now = int(time.time())
+        entries = []
+        for message in messages:
+            if kind == EDITED:
+                # Edits can be sniped for the timeout after the edit rather than after sending.
+                timestamp = now
+            else:
+                timestamp = int(message.created_at.replace(tzinfo=timezone.utc).timestamp())
+            expiry = timestamp + int(config["timeout"])
+            if expiry <= now:
+                continue
+            entries.append(
+                SnipeRecord(
+                    message.content,
+                    message.author.id,
+                    message.id,
+                    timestamp,
+                    expiry,
+                    tuple(attachment.url for attachment in message.attachments),
+                )
+            )
+        self.cache.add_many((channel, kind), entries)
+
+    def snipe_embed(self, ctx, channel, channelsnipe, kind):
+        author = ctx.guild.get_member(channelsnipe.author)
+        timestamp = datetime.utcfromtimestamp(channelsnipe.timestamp)
+        content = channelsnipe.content
+        if not content:
             embed = discord.Embed(
                 description="No message content.\nThe deleted message may have been an image or an embed.",
-                timestamp=channelsnipe["timestamp"],
+                timestamp=timestamp,
                 color=ctx.author.color,
             )
         else:
-            embed = discord.Embed(
-                description=channelsnipe["content"],
-                timestamp=channelsnipe["timestamp"],
-                color=ctx.author.color,
+            embed = discord.Embed(description=content, timestamp=timestamp, color=ctx.author.color)
+        if channelsnipe.attachments:
+            embed.add_field(
+                name="Attachments",
+                value="\n".join(
+                    f"[{url.rsplit('/', 1)[-1]}]({url})" for url in channelsnipe.attachments
+                )[:1024],
+            )
+        if kind == EDITED:
+            embed.add_field(
+                name="Edited message",
+                value=f"[Jump to message](https://discord.com/channels/{ctx.guild.id}/{channel.id}/{channelsnipe.message})",
             )
         embed.set_footer(text=f"Sniped by: {str(ctx.author)}")
         if author is None:
             embed.set_author(name="Removed Member")
         else:
             embed.set_author(name=f"{author} ({author.id})", icon_url=author.avatar_url)
-        await ctx.send(embed=embed)
+        return embed
+
+    async def get_snipes(self, ctx, channel, kind):
+        config = self.snipe_config(ctx.guild.id)
+        if config is None:
+            await ctx.send(
+                f"Sniping is not allowed in this server! An admin may turn it on by typing the `{ctx.clean_prefix}snipeset enable` command."
+            )
+            return []
+        now = time.time()
+        # The timeout may have been lowered since the messages were cached.
+        snipes = [
+            entry
+            for entry in self.cache.get((channel.id, kind), now)
+            if now - entry.timestamp <= config["timeout"]
+        ]
+        if not snipes:
+            await ctx.send("There's nothing to snipe!")
+        return snipes
+
+    async def send_snipe(self, ctx, channel, index, kind):
+        channel = channel or ctx.channel
+        snipes = await self.get_snipes(ctx, channel, kind)
+        if not snipes:
+            return
+        if not 1 <= index <= len(snipes):
+            await ctx.send(f"There are only {len(snipes)} messages to snipe in {channel.mention}.")
+            return
+        await ctx.send(embed=self.snipe_embed(ctx, channel, snipes[index - 1], kind))
+
+    async def send_bulk(self, ctx, channel, kind):
+        channel = channel or ctx.channel
+        snipes = await self.get_snipes(ctx, channel, kind)
+        if not snipes:
+            return
+        embeds = []
+        for index, entry in enumerate(snipes, 1):
+            embed = self.snipe_embed(ctx, channel, entry, kind)
+            embed.set_footer(text=f"Sniped by: {str(ctx.author)} | Page {index}/{len(snipes)}")
+            embeds.append(embed)
+        if len(embeds) == 1:
+            await ctx.send(embed=embeds[0])
+        else:
+            await menu(ctx, embeds, DEFAULT_CONTROLS)
+
+    @commands.cooldown(rate=1, per=5, type=commands.BucketType.channel)
+    @commands.group(invoke_without_command=True)
+    async def snipe(
+        self, ctx, channel: Optional[discord.TextChannel] = None, index: Optional[int] = 1
+    ):
+        """Shows the last deleted message from a specified channel.
+
+        Use an index to show an older deleted message, 1 being the latest."""
+        await self.send_snipe(ctx, channel, index, DELETED)
+
+    @snipe.command(name="bulk")
+    async def snipe_bulk(self, ctx, channel: Optional[discord.TextChannel] = None):
+        """Shows every deleted message still cached for a specified channel."""
+        await self.send_bulk(ctx, channel, DELETED)
+
+    @commands.cooldown(rate=1, per=5, type=commands.BucketType.channel)
+    @commands.group(invoke_without_command=True)
+    async def editsnipe(
+        self, ctx, channel: Optional[discord.TextChannel] = None, index: Optional[int] = 1
+    ):
+        """Shows the last edited message from a specified channel, as it was before the edit.
+
+        Use an index to show an older edit, 1 being the latest."""
+        await self.send_snipe(ctx, channel, index, EDITED)
+
+    @editsnipe.command(name="bulk")
+    async def editsnipe_bulk(self, ctx, channel: Optional[discord.TextChannel] = None):
+        """Shows every edited message still cached for a specified channel."""
+        await self.send_bulk(ctx, channel, EDITED)
 
     @checks.admin()
     @commands.group()
@@ -194,4 +303,35 @@ class Snipe(commands.Cog):
         """
         duration = time.total_seconds()
         await self.config.timer.set(duration)
+        self.timer = duration
         await ctx.tick()
+
+    @snipeset.command()
+    @commands.is_owner()
+    async def budget(self, ctx, kilobytes: int):
+        """
+        Set how much memory the snipe cache may use across all servers, in kilobytes.
+
+        Once it is used up the oldest messages of the least recently used channels are dropped.
+        """
+        if kilobytes < 1:
+            return await ctx.send("The budget must be at least 1 kilobyte.")
+        await self.config.budget.set(kilobytes * 1024)
+        self.cache.budget = kilobytes * 1024
+        self.cache.evict()
+        await ctx.tick()
+
+    @snipeset.command()
+    @commands.is_owner()
+    async def memory(self, ctx):
+        """Show how much memory the snipe cache is using."""
+        stats = self.cache.stats()
+        average = stats["bytes"] // stats["entries"] if stats["entries"] else 0
+        msg = (
+            f"**Messages**: {humanize_number(stats['entries'])} in {humanize_number(stats['buffers'])} channel buffers\n"
+            f"**Memory**: {humanize_number(stats['bytes'] // 1024)} / {humanize_number(stats['budget'] // 1024)} KB "
+            f"({stats['bytes'] * 100 / stats['budget']:.1f}%)\n"
+            f"**Average message**: {humanize_number(average)} bytes\n"
+            f"**Pending expiries**: {humanize_number(stats['heap'])}"
+        )
+        await ctx.maybe_send_embed(msg)